@@ -0,0 +1,47 @@
+"""Migration: add the api_rate_counter table for atomic daily quota reservations"""
+import logging
+from database import Database
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def add_api_rate_counter():
+    """Create api_rate_counter and seed today's row from data_fetch_log"""
+    db = Database()
+
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                logger.info("Creating api_rate_counter table...")
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS api_rate_counter (
+                        day DATE PRIMARY KEY,
+                        count INTEGER NOT NULL DEFAULT 0
+                    )
+                """)
+
+                # Start today's count from the calls already logged, so the
+                # switch-over doesn't hand out a fresh daily quota
+                cur.execute("""
+                    INSERT INTO api_rate_counter (day, count)
+                    SELECT CURRENT_DATE, COALESCE(SUM(api_calls_used), 0)
+                    FROM data_fetch_log
+                    WHERE fetch_timestamp >= CURRENT_DATE
+                    AND fetch_timestamp < CURRENT_DATE + 1
+                    AND success = true
+                    ON CONFLICT (day) DO NOTHING
+                """)
+
+                conn.commit()
+                logger.info("✓ api_rate_counter table added successfully!")
+
+        return True
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    add_api_rate_counter()
@@ -0,0 +1,36 @@
+"""Migration: add cash flow columns to financial_snapshots"""
+import logging
+from database import Database
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def add_cashflow_columns():
+    """Add operating_cash_flow and free_cash_flow to financial_snapshots"""
+    db = Database()
+
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                # One ALTER takes the table lock once for both columns; with no
+                # default the additions are metadata-only
+                logger.info("Adding cash flow columns to financial_snapshots...")
+                cur.execute("""
+                    ALTER TABLE financial_snapshots
+                        ADD COLUMN IF NOT EXISTS operating_cash_flow NUMERIC(20, 2),
+                        ADD COLUMN IF NOT EXISTS free_cash_flow NUMERIC(20, 2)
+                """)
+
+                conn.commit()
+                logger.info("✓ Cash flow columns added successfully!")
+
+        return True
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    add_cashflow_columns()
@@ -0,0 +1,58 @@
+"""Migration: store financial_snapshots.raw_data zstd-compressed"""
+import logging
+from database import Database, compress_raw_data
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def add_raw_data_zst():
+    """Add raw_data_zst and move existing raw_data JSONB into it"""
+    db = Database()
+
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                logger.info("Adding raw_data_zst column to financial_snapshots...")
+                cur.execute("""
+                    ALTER TABLE financial_snapshots
+                        ADD COLUMN IF NOT EXISTS raw_data_zst BYTEA
+                """)
+                conn.commit()
+
+                # Backfill in batches so each transaction stays short; rows
+                # are cleared as they are moved, so the loop always picks up
+                # where it left off
+                moved = 0
+                while True:
+                    cur.execute("""
+                        SELECT id, raw_data FROM financial_snapshots
+                        WHERE raw_data IS NOT NULL
+                        LIMIT %s
+                    """, (BATCH_SIZE,))
+                    rows = cur.fetchall()
+                    if not rows:
+                        break
+
+                    cur.executemany("""
+                        UPDATE financial_snapshots
+                        SET raw_data_zst = %s, raw_data = NULL
+                        WHERE id = %s
+                    """, [(compress_raw_data(raw_data), row_id) for row_id, raw_data in rows])
+                    conn.commit()
+                    moved += len(rows)
+                    logger.info(f"  Compressed {moved} snapshots")
+
+                logger.info(f"✓ raw_data_zst added, {moved} snapshots compressed")
+
+        return True
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    add_raw_data_zst()
@@ -0,0 +1,40 @@
+"""Migration: add the generated ticker_last_char column to companies"""
+import logging
+from database import Database
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def add_ticker_last_char():
+    """Add ticker_last_char (right(ticker, 1)) and index it"""
+    db = Database()
+
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                # A stored generated column rewrites the table once to fill
+                # in existing rows; new rows are computed on insert
+                logger.info("Adding ticker_last_char column to companies...")
+                cur.execute("""
+                    ALTER TABLE companies
+                        ADD COLUMN IF NOT EXISTS ticker_last_char CHAR(1)
+                        GENERATED ALWAYS AS (right(ticker, 1)) STORED
+                """)
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_companies_ticker_last_char
+                    ON companies(ticker_last_char)
+                """)
+
+                conn.commit()
+                logger.info("✓ ticker_last_char column added successfully!")
+
+        return True
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    add_ticker_last_char()
@@ -1,95 +1,117 @@
 """Financial ratio calculations"""
-from decimal import Decimal
+import math
 from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _to_float(value) -> float:
+    """Convert a Decimal/int/float input to float, using NaN for missing values"""
+    return float(value) if value is not None else math.nan
+
+
+def _is_missing(value: Optional[float]) -> bool:
+    """Check if a ratio is missing (None or NaN)"""
+    return value is None or math.isnan(value)
+
+
 class FinancialCalculator:
-    """Calculate financial ratios and metrics"""
+    """Calculate financial ratios and metrics
     
-    @staticmethod
-    def safe_divide(numerator: Decimal, denominator: Decimal) -> Optional[Decimal]:
-        """Safely divide two decimals, returning None if denominator is zero"""
-        if denominator == 0:
-            return None
-        return numerator / denominator
+    Ratios are calculated in float64; NaN means the ratio is undefined.
+    Callers get Decimal-free results that psycopg2 can store directly.
+    """
     
     @staticmethod
-    def calculate_pe_ratio(stock_price: Decimal, net_income: Decimal, shares_outstanding: Decimal) -> Optional[Decimal]:
+    def calculate_pe_ratio(stock_price: float, net_income: float, shares_outstanding: float) -> float:
         """Calculate Price-to-Earnings ratio
         
         P/E = Stock Price / Earnings Per Share
         EPS = Net Income / Shares Outstanding
         """
         if shares_outstanding == 0 or net_income <= 0:
-            return None
+            return math.nan
         
         eps = net_income / shares_outstanding
-        return FinancialCalculator.safe_divide(stock_price, eps)
+        try:
+            return stock_price / eps
+        except ZeroDivisionError:
+            return math.nan
     
     @staticmethod
-    def calculate_pb_ratio(market_cap: Decimal, equity: Decimal) -> Optional[Decimal]:
+    def calculate_pb_ratio(market_cap: float, equity: float) -> float:
         """Calculate Price-to-Book ratio
         
         P/B = Market Cap / Book Value (Total Equity)
         """
-        return FinancialCalculator.safe_divide(market_cap, equity)
+        try:
+            return market_cap / equity
+        except ZeroDivisionError:
+            return math.nan
     
     @staticmethod
-    def calculate_debt_to_equity(debt: Decimal, equity: Decimal) -> Optional[Decimal]:
+    def calculate_debt_to_equity(debt: float, equity: float) -> float:
         """Calculate Debt-to-Equity ratio
         
         D/E = Total Debt / Total Equity
         """
-        return FinancialCalculator.safe_divide(debt, equity)
+        try:
+            return debt / equity
+        except ZeroDivisionError:
+            return math.nan
     
     @staticmethod
-    def calculate_current_ratio(assets: Decimal, liabilities: Decimal) -> Optional[Decimal]:
+    def calculate_current_ratio(assets: float, liabilities: float) -> float:
         """Calculate Current ratio (simplified using total assets/liabilities)
         
         Note: This is a simplified version. Ideally we'd use current assets/current liabilities
         """
-        return FinancialCalculator.safe_divide(assets, liabilities)
+        try:
+            return assets / liabilities
+        except ZeroDivisionError:
+            return math.nan
     
     @staticmethod
-    def calculate_roe(net_income: Decimal, equity: Decimal) -> Optional[Decimal]:
+    def calculate_roe(net_income: float, equity: float) -> float:
         """Calculate Return on Equity
         
         ROE = Net Income / Total Equity
         """
-        return FinancialCalculator.safe_divide(net_income, equity)
+        try:
+            return net_income / equity
+        except ZeroDivisionError:
+            return math.nan
     
     @staticmethod
     def calculate_difficulty_score(
-        pe_ratio: Optional[Decimal],
-        pb_ratio: Optional[Decimal],
-        debt_to_equity: Optional[Decimal],
-        market_cap: Decimal
+        pe_ratio: Optional[float],
+        pb_ratio: Optional[float],
+        debt_to_equity: Optional[float],
+        market_cap: float
     ) -> int:
         """Calculate a difficulty score from 1-10 based on various factors
         
         Higher scores = more difficult to evaluate
         Factors considered:
-        - Missing ratios increase difficulty
+        - Missing ratios (None or NaN) increase difficulty
         - Extreme ratios increase difficulty
         - Smaller companies are generally harder to evaluate
         """
         score = 5  # Base score
         
         # Missing data increases difficulty
-        if pe_ratio is None:
+        if _is_missing(pe_ratio):
             score += 1
         elif pe_ratio < 0 or pe_ratio > 100:
             score += 2  # Extreme P/E ratios
         
-        if pb_ratio is None:
+        if _is_missing(pb_ratio):
             score += 1
         elif pb_ratio > 10:
             score += 1  # High P/B ratio
         
-        if debt_to_equity is None:
+        if _is_missing(debt_to_equity):
             score += 1
         elif debt_to_equity > 3:
             score += 1  # High leverage
@@ -105,19 +127,30 @@ class FinancialCalculator:
     
     @staticmethod
     def calculate_all_metrics(
-        stock_price: Decimal,
-        market_cap: Decimal,
-        net_income: Decimal,
-        shares_outstanding: Decimal,
-        assets: Decimal,
-        liabilities: Decimal,
-        equity: Decimal,
-        debt: Decimal
+        stock_price,
+        market_cap,
+        net_income,
+        shares_outstanding,
+        assets,
+        liabilities,
+        equity,
+        debt
     ) -> dict:
         """Calculate all financial metrics
         
-        Returns a dictionary with all calculated ratios
+        Inputs may be Decimal, int or float (None counts as missing); they are
+        converted to float once here. Returns a dictionary with all calculated
+        ratios as floats, or None where a ratio is undefined.
         """
+        stock_price = _to_float(stock_price)
+        market_cap = _to_float(market_cap)
+        net_income = _to_float(net_income)
+        shares_outstanding = _to_float(shares_outstanding)
+        assets = _to_float(assets)
+        liabilities = _to_float(liabilities)
+        equity = _to_float(equity)
+        debt = _to_float(debt)
+        
         pe_ratio = FinancialCalculator.calculate_pe_ratio(stock_price, net_income, shares_outstanding)
         pb_ratio = FinancialCalculator.calculate_pb_ratio(market_cap, equity)
         debt_to_equity = FinancialCalculator.calculate_debt_to_equity(debt, equity)
@@ -129,10 +162,10 @@ class FinancialCalculator:
         )
         
         return {
-            'p_e_ratio': round(pe_ratio, 2) if pe_ratio else None,
-            'p_b_ratio': round(pb_ratio, 2) if pb_ratio else None,
-            'debt_to_equity': round(debt_to_equity, 2) if debt_to_equity else None,
-            'current_ratio': round(current_ratio, 2) if current_ratio else None,
-            'roe': round(roe * 100, 2) if roe else None,  # Convert to percentage
+            'p_e_ratio': None if math.isnan(pe_ratio) else round(pe_ratio, 2),
+            'p_b_ratio': None if math.isnan(pb_ratio) else round(pb_ratio, 2),
+            'debt_to_equity': None if math.isnan(debt_to_equity) else round(debt_to_equity, 2),
+            'current_ratio': None if math.isnan(current_ratio) else round(current_ratio, 2),
+            'roe': None if math.isnan(roe) else round(roe * 100, 2),  # Convert to percentage
             'difficulty_score': difficulty_score
         }
\ No newline at end of file
@@ -1,6 +1,6 @@
-from database import Database
+from db_singleton import get_db
 
-db = Database()
+db = get_db()
 with db.get_connection() as conn:
     cur = conn.cursor()
     cur.execute('SELECT COUNT(*) FROM companies')
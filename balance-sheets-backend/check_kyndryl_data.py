@@ -1,11 +1,11 @@
 """Check Kyndryl historical data"""
-from database import Database
+from db_singleton import get_db
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-db = Database()
+db = get_db()
 with db.get_connection() as conn:
     with conn.cursor() as cur:
         # Get company info
@@ -13,34 +13,38 @@ with db.get_connection() as conn:
         company_id, name = cur.fetchone()
         logger.info(f"Company: {name} (ID: {company_id})")
         
-        # Get financial snapshots
+        # Get financial snapshots (amounts cast to float8 so they arrive as floats, not Decimal)
         cur.execute("""
             SELECT 
                 report_type,
                 period_end_date,
-                revenue,
-                net_income,
-                assets,
-                liabilities
+                revenue::float8,
+                net_income::float8,
+                assets::float8,
+                liabilities::float8
             FROM financial_snapshots
             WHERE company_id = %s
             ORDER BY period_end_date DESC
         """, (company_id,))
         
         results = cur.fetchall()
-        logger.info(f"\nFinancial Snapshots: {len(results)} total")
-        logger.info("-" * 80)
+        lines = [f"\nFinancial Snapshots: {len(results)} total", "-" * 80]
         
         for report_type, date, revenue, net_income, assets, liabilities in results:
             # Convert to billions for readability
-            rev_b = float(revenue) / 1e9 if revenue else 0
-            income_b = float(net_income) / 1e9 if net_income else 0
-            assets_b = float(assets) / 1e9 if assets else 0
-            liab_b = float(liabilities) / 1e9 if liabilities else 0
+            rev_b = revenue / 1e9 if revenue else 0
+            income_b = net_income / 1e9 if net_income else 0
+            assets_b = assets / 1e9 if assets else 0
+            liab_b = liabilities / 1e9 if liabilities else 0
             
-            logger.info(f"{date} ({report_type}):")
-            logger.info(f"  Revenue: ${rev_b:.1f}B")
-            logger.info(f"  Net Income: ${income_b:.2f}B")
-            logger.info(f"  Assets: ${assets_b:.1f}B")
-            logger.info(f"  Liabilities: ${liab_b:.1f}B")
-            logger.info("")
\ No newline at end of file
+            lines.extend([
+                f"{date} ({report_type}):",
+                f"  Revenue: ${rev_b:.1f}B",
+                f"  Net Income: ${income_b:.2f}B",
+                f"  Assets: ${assets_b:.1f}B",
+                f"  Liabilities: ${liab_b:.1f}B",
+                ""
+            ])
+        
+        # Emit a single log record for the whole listing
+        logger.info('\n'.join(lines))
\ No newline at end of file
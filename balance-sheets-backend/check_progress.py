@@ -1,16 +1,16 @@
 """Check batch fetch progress"""
-from database import Database
+from db_singleton import get_db
 
-db = Database()
+db = get_db()
 
 with db.get_connection() as conn:
     with conn.cursor() as cur:
-        # Count companies
-        cur.execute('SELECT COUNT(DISTINCT ticker) FROM companies')
+        # Count companies (ticker is UNIQUE, so no DISTINCT needed)
+        cur.execute('SELECT COUNT(*) FROM companies')
         total = cur.fetchone()[0]
         
         # Get company list
-        cur.execute('SELECT ticker, name FROM companies ORDER BY id')
+        cur.execute('SELECT ticker, name FROM companies ORDER BY ticker')
         companies = cur.fetchall()
         
         print(f"\nTotal companies in database: {total}")
@@ -0,0 +1,60 @@
+"""Background writer for collection progress checkpoints"""
+import logging
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointWriter:
+    """Writes JSON progress checkpoints on a daemon thread
+
+    submit() hands over a function that builds the checkpoint and returns
+    immediately, so file writes (and any queries the builder runs) stay off
+    the collection loop. Only the latest unwritten checkpoint is kept: a
+    burst of submits while a write is in progress coalesces into one write.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._pending = queue.Queue(maxsize=1)
+        threading.Thread(target=self._run, name=f"checkpoint-{path}", daemon=True).start()
+
+    def submit(self, build: Callable[[], Dict[str, Any]]):
+        """Queue a checkpoint, replacing any that hasn't been written yet"""
+        while True:
+            try:
+                self._pending.put_nowait(build)
+                return
+            except queue.Full:
+                try:
+                    self._pending.get_nowait()
+                    self._pending.task_done()
+                except queue.Empty:
+                    pass
+
+    def flush(self):
+        """Block until the last submitted checkpoint has been written"""
+        self._pending.join()
+
+    def _run(self):
+        while True:
+            build = self._pending.get()
+            try:
+                self._write(build())
+            except Exception as e:
+                logger.error(f"Failed to save progress to {self.path}: {e}")
+            finally:
+                self._pending.task_done()
+
+    def _write(self, progress: Dict[str, Any]):
+        # Write a temp file and rename it over the old one, so a crash
+        # mid-write never leaves a truncated progress file behind
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(progress, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_path, self.path)
@@ -1,178 +1,171 @@
 """Comprehensive script to find and remove all bond/note/preferred stock entries from the database"""
 import logging
-from database import Database
+from database import execute_prepared
+from db_singleton import get_db
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Summary group for each kind tagged by the bond scan query
+BOND_TYPE_LABELS = {
+    'percent': 'Bonds/Notes with %',
+    'bond': 'Other Bonds/Notes',
+    'preferred': 'Preferred Stocks',
+    'warrant': 'Warrants/Units',
+}
+
 def find_all_bond_like_entries():
     """Find all bond, note, and preferred stock entries"""
-    db = Database()
+    db = get_db()
     all_ids = set()
     
     try:
         with db.get_connection() as conn:
-            with conn.cursor() as cur:
-                # 1. Companies with percentage signs (bonds/notes with yields)
-                cur.execute("""
-                    SELECT c.id, c.ticker, c.name
-                    FROM companies c
-                    WHERE c.name LIKE '%\\%%' ESCAPE '\\'
-                """)
-                percent_results = cur.fetchall()
-                percent_ids = [r[0] for r in percent_results]
-                all_ids.update(percent_ids)
-                print(f"\n1. Found {len(percent_ids)} companies with % in name (bonds/notes with yields)")
-                
-                # 2. Companies with bond/note keywords
-                cur.execute("""
-                    SELECT c.id, c.ticker, c.name
-                    FROM companies c
-                    WHERE c.name ~* '\\b(notes?|bonds?|debentures?)\\b'
-                       OR c.name ~* '\\bdue\\s+\\d{4}\\b'
-                       OR c.name ~* '\\b(senior|subordinated|convertible)\\s+(notes?|bonds?)\\b'
-                       OR c.name LIKE '%NTS%' OR c.name LIKE '%NTB%' OR c.name LIKE '%NT %'
-                       OR c.name LIKE '%SR %' OR c.name LIKE '%JR %'
-                       OR c.name LIKE '%JRSUB%' OR c.name LIKE '%SRSUB%'
-                """)
-                bond_results = cur.fetchall()
-                bond_ids = [r[0] for r in bond_results]
-                all_ids.update(bond_ids)
-                print(f"2. Found {len(bond_ids)} companies with bond/note keywords")
-                
-                # 3. Preferred stocks (ticker ends with -P followed by letter)
-                cur.execute("""
-                    SELECT c.id, c.ticker, c.name
-                    FROM companies c
-                    WHERE c.ticker LIKE '%-P%'
-                       OR c.name LIKE '%PFD%'
-                       OR c.name LIKE '%Preferred%'
-                       OR c.name LIKE '%PREFERRED%'
-                """)
-                preferred_results = cur.fetchall()
-                preferred_ids = [r[0] for r in preferred_results]
-                all_ids.update(preferred_ids)
-                print(f"3. Found {len(preferred_ids)} preferred stock entries")
-                
-                # 4. Warrants and units (more specific to avoid false positives)
+            # One pass over companies tags every row with the four bond-like
+            # predicates; a server-side cursor streams the matches in batches
+            # so the full result set is never held in memory.
+            with conn.cursor(name='bond_scan') as cur:
+                cur.itersize = 5000
                 cur.execute("""
-                    SELECT c.id, c.ticker, c.name
-                    FROM companies c
-                    WHERE c.name ~* '\\b(warrant|warrants|unit|units|rights)\\b'
-                       OR c.ticker LIKE '%.WS' OR c.ticker LIKE '%.UN'
-                       OR c.ticker LIKE '%.WT' OR c.ticker LIKE '%.RT'
-                """)
-                warrant_results = cur.fetchall()
-                warrant_ids = [r[0] for r in warrant_results]
-                all_ids.update(warrant_ids)
-                print(f"4. Found {len(warrant_ids)} warrant/unit entries")
-                
-                # Get detailed info for all identified entries
-                if all_ids:
-                    cur.execute("""
-                        SELECT 
+                    WITH flagged AS (
+                        SELECT
                             c.id,
                             c.ticker,
                             c.name,
                             c.sector,
-                            COUNT(fs.id) as snapshot_count,
-                            md.market_cap
+                            -- 1. Percentage signs (bonds/notes with yields)
+                            c.name LIKE '%\\%%' ESCAPE '\\' AS is_percent,
+                            -- 2. Bond/note keywords (\\y is the regex word boundary;
+                            --    \\b would match a backspace)
+                            (c.name ~* '\\y(notes?|bonds?|debentures?)\\y'
+                             OR c.name ~* '\\ydue\\s+\\d{4}\\y'
+                             OR c.name ~* '\\y(senior|subordinated|convertible)\\s+(notes?|bonds?)\\y'
+                             OR c.name LIKE '%NTS%' OR c.name LIKE '%NTB%' OR c.name LIKE '%NT %'
+                             OR c.name LIKE '%SR %' OR c.name LIKE '%JR %'
+                             OR c.name LIKE '%JRSUB%' OR c.name LIKE '%SRSUB%') AS is_bond,
+                            -- 3. Preferred stocks (ticker ends with -P followed by letter)
+                            (c.ticker LIKE '%-P%'
+                             OR c.name LIKE '%PFD%'
+                             OR c.name LIKE '%Preferred%'
+                             OR c.name LIKE '%PREFERRED%') AS is_preferred,
+                            -- 4. Warrants and units (more specific to avoid false positives)
+                            (c.name ~* '\\y(warrant|warrants|unit|units|rights)\\y'
+                             OR c.ticker LIKE '%.WS' OR c.ticker LIKE '%.UN'
+                             OR c.ticker LIKE '%.WT' OR c.ticker LIKE '%.RT') AS is_warrant
                         FROM companies c
-                        LEFT JOIN financial_snapshots fs ON c.id = fs.company_id
-                        LEFT JOIN market_data md ON c.id = md.company_id
-                        WHERE c.id = ANY(%s)
-                        GROUP BY c.id, c.ticker, c.name, c.sector, md.market_cap
-                        ORDER BY c.ticker
-                    """, (list(all_ids),))
-                    
-                    detailed_results = cur.fetchall()
-                    
-                    print(f"\n{'='*120}")
-                    print(f"TOTAL BOND-LIKE ENTRIES FOUND: {len(all_ids)}")
-                    print(f"{'='*120}")
-                    
-                    # Group by type for summary
-                    bond_types = {
-                        'Bonds/Notes with %': [],
-                        'Other Bonds/Notes': [],
-                        'Preferred Stocks': [],
-                        'Warrants/Units': []
-                    }
-                    
-                    for id, ticker, name, sector, snapshot_count, market_cap in detailed_results:
-                        if '%' in name:
-                            bond_types['Bonds/Notes with %'].append((id, ticker, name))
-                        elif ticker.startswith('-P') or 'PFD' in name or 'Preferred' in name.title():
-                            bond_types['Preferred Stocks'].append((id, ticker, name))
-                        elif 'warrant' in name.lower() or 'unit' in name.lower() or ticker.endswith('W') or ticker.endswith('U'):
-                            bond_types['Warrants/Units'].append((id, ticker, name))
-                        else:
-                            bond_types['Other Bonds/Notes'].append((id, ticker, name))
-                    
-                    # Print summary by type
-                    for bond_type, entries in bond_types.items():
-                        if entries:
-                            print(f"\n{bond_type} ({len(entries)} entries):")
-                            print("-" * 100)
-                            for id, ticker, name in entries[:10]:  # Show first 10
-                                print(f"ID: {id:<6} Ticker: {ticker:<15} Name: {name[:60]}")
-                            if len(entries) > 10:
-                                print(f"... and {len(entries) - 10} more")
-                    
-                return list(all_ids)
+                    )
+                    SELECT 
+                        f.id,
+                        f.ticker,
+                        f.name,
+                        f.sector,
+                        f.is_percent,
+                        f.is_bond,
+                        f.is_preferred,
+                        f.is_warrant,
+                        -- Summary group, first matching predicate wins
+                        CASE
+                            WHEN f.is_percent THEN 'percent'
+                            WHEN f.is_preferred THEN 'preferred'
+                            WHEN f.is_warrant THEN 'warrant'
+                            ELSE 'bond'
+                        END AS kind,
+                        (SELECT COUNT(*) FROM financial_snapshots fs WHERE fs.company_id = f.id) as snapshot_count,
+                        md.market_cap
+                    FROM flagged f
+                    LEFT JOIN market_data md ON f.id = md.company_id
+                    WHERE f.is_percent OR f.is_bond OR f.is_preferred OR f.is_warrant
+                    ORDER BY f.ticker
+                """)
+                
+                # Group by type for summary
+                bond_types = {label: [] for label in BOND_TYPE_LABELS.values()}
+                percent_count = bond_count = preferred_count = warrant_count = 0
+                
+                for (id, ticker, name, sector, is_percent, is_bond, is_preferred,
+                     is_warrant, kind, snapshot_count, market_cap) in cur:
+                    all_ids.add(id)
+                    percent_count += is_percent
+                    bond_count += is_bond
+                    preferred_count += is_preferred
+                    warrant_count += is_warrant
+                    bond_types[BOND_TYPE_LABELS[kind]].append((id, ticker, name))
+                
+            print(f"\n1. Found {percent_count} companies with % in name (bonds/notes with yields)")
+            print(f"2. Found {bond_count} companies with bond/note keywords")
+            print(f"3. Found {preferred_count} preferred stock entries")
+            print(f"4. Found {warrant_count} warrant/unit entries")
+            
+            if all_ids:
+                print(f"\n{'='*120}")
+                print(f"TOTAL BOND-LIKE ENTRIES FOUND: {len(all_ids)}")
+                print(f"{'='*120}")
+                
+                # Print summary by type
+                for bond_type, entries in bond_types.items():
+                    if entries:
+                        print(f"\n{bond_type} ({len(entries)} entries):")
+                        print("-" * 100)
+                        for id, ticker, name in entries[:10]:  # Show first 10
+                            print(f"ID: {id:<6} Ticker: {ticker:<15} Name: {name[:60]}")
+                        if len(entries) > 10:
+                            print(f"... and {len(entries) - 10} more")
+                
+            return list(all_ids)
                 
     except Exception as e:
         logger.error(f"Error finding bond entries: {e}")
         raise
 
+# Deletes for the tables that reference companies, in foreign key order
+STATEMENTS = [
+    ('user_matches', "DELETE FROM user_matches WHERE company_id = ANY($1)"),
+    ('chat_sessions', "DELETE FROM chat_sessions WHERE company_id = ANY($1)"),
+    ('chat_messages', """
+        DELETE FROM chat_messages 
+        WHERE session_id IN (
+            SELECT id FROM chat_sessions WHERE company_id = ANY($1)
+        )
+    """),
+    ('company_metrics', "DELETE FROM company_metrics WHERE company_id = ANY($1)"),
+    ('market_data', "DELETE FROM market_data WHERE company_id = ANY($1)"),
+    ('financial_snapshots', "DELETE FROM financial_snapshots WHERE company_id = ANY($1)"),
+    ('annual_reports', "DELETE FROM annual_reports WHERE company_id = ANY($1)"),
+]
+
+# data_fetch_log is keyed by ticker, so it must go before the companies
+DELETE_FETCH_LOG = """
+    DELETE FROM data_fetch_log 
+    WHERE ticker IN (SELECT ticker FROM companies WHERE id = ANY($1))
+"""
+DELETE_COMPANIES = "DELETE FROM companies WHERE id = ANY($1)"
+
 def delete_bond_entries(company_ids):
     """Delete specified companies and all their related data"""
-    db = Database()
+    db = get_db()
     
     try:
         with db.get_connection() as conn:
             with conn.cursor() as cur:
                 print(f"\nPreparing to delete {len(company_ids)} bond-like entries...")
                 
-                # Delete in order due to foreign key constraints
-                tables_to_clean = [
-                    ('user_matches', 'company_id'),
-                    ('chat_sessions', 'company_id'),
-                    ('chat_messages', 'company_id IN (SELECT id FROM chat_sessions WHERE company_id = ANY(%s))'),
-                    ('company_metrics', 'company_id'),
-                    ('market_data', 'company_id'),
-                    ('financial_snapshots', 'company_id'),
-                    ('annual_reports', 'company_id'),
-                ]
-                
+                # Delete in order due to foreign key constraints; pooled
+                # connections keep the prepared deletes for later calls
                 total_deleted = 0
-                for table, condition in tables_to_clean:
-                    if 'chat_messages' in table:
-                        # Special handling for chat_messages
-                        cur.execute("""
-                            DELETE FROM chat_messages 
-                            WHERE session_id IN (
-                                SELECT id FROM chat_sessions WHERE company_id = ANY(%s)
-                            )
-                        """, (company_ids,))
-                    else:
-                        cur.execute(f"DELETE FROM {table} WHERE {condition} = ANY(%s)", (company_ids,))
-                    
+                for table, statement in STATEMENTS:
+                    execute_prepared(cur, f"del_{table}", statement, (company_ids,))
                     deleted = cur.rowcount
                     total_deleted += deleted
                     if deleted > 0:
                         print(f"  - Deleted {deleted} rows from {table}")
                 
                 # Delete from data_fetch_log (uses ticker)
-                cur.execute("""
-                    DELETE FROM data_fetch_log 
-                    WHERE ticker IN (SELECT ticker FROM companies WHERE id = ANY(%s))
-                """, (company_ids,))
+                execute_prepared(cur, "del_data_fetch_log", DELETE_FETCH_LOG, (company_ids,))
                 if cur.rowcount > 0:
                     print(f"  - Deleted {cur.rowcount} rows from data_fetch_log")
                 
                 # Finally, delete the companies
-                cur.execute("DELETE FROM companies WHERE id = ANY(%s)", (company_ids,))
+                execute_prepared(cur, "del_companies", DELETE_COMPANIES, (company_ids,))
                 deleted_companies = cur.rowcount
                 
                 conn.commit()
@@ -188,7 +181,7 @@ def delete_bond_entries(company_ids):
 
 def get_game_ready_companies():
     """Get count of companies that are suitable for the game (not bonds/notes/preferred)"""
-    db = Database()
+    db = get_db()
     
     try:
         with db.get_connection() as conn:
@@ -1,13 +1,18 @@
 """Script to remove the most obvious bond/note entries (those with % in name)"""
 import logging
-from database import Database
+import sys
+import company_cleanup
+from db_singleton import get_db
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Detail row layout for the bond listing
+ROW_TEMPLATE = '{:<8} {:<15} {:<60} {:<15}'.format
+
 def find_obvious_bonds():
     """Find companies with % in name - these are clearly bonds/notes"""
-    db = Database()
+    db = get_db()
     
     try:
         with db.get_connection() as conn:
@@ -23,16 +28,21 @@ def find_obvious_bonds():
                 
                 results = cur.fetchall()
                 
-                print(f"Found {len(results)} companies with % in name (obvious bonds/notes):")
-                print("-" * 100)
-                print(f"{'ID':<8} {'Ticker':<15} {'Name':<60} {'Market Cap':<15}")
-                print("-" * 100)
+                lines = [
+                    f"Found {len(results)} companies with % in name (obvious bonds/notes):",
+                    "-" * 100,
+                    ROW_TEMPLATE('ID', 'Ticker', 'Name', 'Market Cap'),
+                    "-" * 100
+                ]
                 
                 ids = []
                 for id, ticker, name, market_cap in results:
                     ids.append(id)
                     market_cap_str = f"${market_cap:,.0f}" if market_cap else "N/A"
-                    print(f"{id:<8} {ticker:<15} {name[:60]:<60} {market_cap_str:<15}")
+                    lines.append(ROW_TEMPLATE(id, ticker, name[:60], market_cap_str))
+                
+                # One write for the whole listing instead of a print per row
+                sys.stdout.write('\n'.join(lines) + '\n')
                 
                 return ids
                 
@@ -42,36 +52,15 @@ def find_obvious_bonds():
 
 def delete_companies(company_ids):
     """Delete companies and their data"""
-    db = Database()
-    
     try:
-        with db.get_connection() as conn:
-            with conn.cursor() as cur:
-                # Delete related data first
-                cur.execute("DELETE FROM user_matches WHERE company_id = ANY(%s)", (company_ids,))
-                cur.execute("DELETE FROM chat_messages WHERE session_id IN (SELECT id FROM chat_sessions WHERE company_id = ANY(%s))", (company_ids,))
-                cur.execute("DELETE FROM chat_sessions WHERE company_id = ANY(%s)", (company_ids,))
-                cur.execute("DELETE FROM company_metrics WHERE company_id = ANY(%s)", (company_ids,))
-                cur.execute("DELETE FROM market_data WHERE company_id = ANY(%s)", (company_ids,))
-                cur.execute("DELETE FROM financial_snapshots WHERE company_id = ANY(%s)", (company_ids,))
-                # Skip annual_reports table as it doesn't exist
-                # cur.execute("DELETE FROM annual_reports WHERE company_id = ANY(%s)", (company_ids,))
-                cur.execute("DELETE FROM data_fetch_log WHERE ticker IN (SELECT ticker FROM companies WHERE id = ANY(%s))", (company_ids,))
-                
-                # Delete companies
-                cur.execute("DELETE FROM companies WHERE id = ANY(%s)", (company_ids,))
-                deleted = cur.rowcount
-                
-                conn.commit()
-                print(f"\nSuccessfully deleted {deleted} bond entries.")
+        deleted = company_cleanup.delete_companies(company_ids)
+        print(f"\nSuccessfully deleted {deleted} bond entries.")
                 
     except Exception as e:
         logger.error(f"Error deleting: {e}")
         raise
 
 if __name__ == "__main__":
-    import sys
-    
     bond_ids = find_obvious_bonds()
     
     if bond_ids:
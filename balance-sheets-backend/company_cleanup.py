@@ -0,0 +1,52 @@
+"""Shared delete of companies and everything that references them"""
+import io
+from typing import Iterable
+
+from db_singleton import get_db
+
+
+def delete_companies(company_ids: Iterable[int]) -> int:
+    """Delete companies and all their related data in one transaction
+    
+    Returns the number of companies deleted.
+    """
+    db = get_db()
+    
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            # Load the IDs into a temp table so every lookup below is a join
+            cur.execute("CREATE TEMP TABLE tmp_ids (id INTEGER PRIMARY KEY) ON COMMIT DROP")
+            cur.copy_expert("COPY tmp_ids FROM STDIN", io.StringIO('\n'.join(map(str, company_ids))))
+            cur.execute("ANALYZE tmp_ids")
+            
+            # Delete related data first, then the companies, in one statement.
+            # All parts share one snapshot, so the subqueries on chat_sessions
+            # and companies still see the rows being deleted alongside them.
+            cur.execute("""
+                WITH d_user_matches AS (
+                    DELETE FROM user_matches WHERE company_id IN (SELECT id FROM tmp_ids)
+                ), d_chat_messages AS (
+                    DELETE FROM chat_messages WHERE session_id IN (
+                        SELECT cs.id FROM chat_sessions cs JOIN tmp_ids t ON cs.company_id = t.id
+                    )
+                ), d_chat_sessions AS (
+                    DELETE FROM chat_sessions WHERE company_id IN (SELECT id FROM tmp_ids)
+                ), d_company_metrics AS (
+                    DELETE FROM company_metrics WHERE company_id IN (SELECT id FROM tmp_ids)
+                ), d_market_data AS (
+                    DELETE FROM market_data WHERE company_id IN (SELECT id FROM tmp_ids)
+                ), d_financial_snapshots AS (
+                    DELETE FROM financial_snapshots WHERE company_id IN (SELECT id FROM tmp_ids)
+                ), d_annual_reports AS (
+                    DELETE FROM annual_reports WHERE company_id IN (SELECT id FROM tmp_ids)
+                ), d_data_fetch_log AS (
+                    DELETE FROM data_fetch_log WHERE ticker IN (
+                        SELECT c.ticker FROM companies c JOIN tmp_ids t ON c.id = t.id
+                    )
+                )
+                DELETE FROM companies WHERE id IN (SELECT id FROM tmp_ids)
+            """)
+            deleted = cur.rowcount
+            
+            conn.commit()
+            return deleted
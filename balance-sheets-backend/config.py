@@ -20,6 +20,15 @@ FMP_RATE_LIMIT_PER_DAY = 1000000  # Premium tier: effectively unlimited
 FMP_RETRY_ATTEMPTS = 3
 FMP_RETRY_DELAY = 1  # seconds
 FMP_CALLS_PER_BATCH = 700  # Stay under 750/min limit with buffer
+FMP_RATE_LIMIT_BURST = 50  # Token-bucket burst; burst + 700 refill stays under 750/min
+
+# On-disk FMP response cache (set FMP_CACHE_DIR to an empty string to disable)
+FMP_CACHE_DIR = os.getenv('FMP_CACHE_DIR', '.fmp_cache')
+FMP_CACHE_TTL = {  # seconds, by the endpoint's first path segment
+    'quote': 60,
+    'profile': 3600,
+}
+FMP_CACHE_DEFAULT_TTL = 86400  # Filed statements and metrics rarely change within a day
 
 # Logging
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -27,6 +36,8 @@ LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
 # Database Configuration
 DB_SCHEMA = 'public'
+DB_POOL_MIN_CONN = 1
+DB_POOL_MAX_CONN = int(os.getenv('DB_POOL_MAX_CONN', '16'))
 
 # Validate required environment variables
 required_vars = ['FMP_API_KEY', 'SUPABASE_URL', 'SUPABASE_KEY']
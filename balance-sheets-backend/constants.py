@@ -0,0 +1,35 @@
+"""Ticker lists shared by the collection scripts"""
+
+# Top 20 companies by market cap (diverse sectors)
+TOP_COMPANIES = (
+    'AAPL',   # Apple - Technology
+    'GOOGL',  # Alphabet - Technology
+    'AMZN',   # Amazon - Consumer Cyclical
+    'NVDA',   # NVIDIA - Technology
+    'META',   # Meta - Technology
+    'TSLA',   # Tesla - Consumer Cyclical
+    'BRK.B',  # Berkshire Hathaway - Financial
+    'LLY',    # Eli Lilly - Healthcare
+    'V',      # Visa - Financial Services
+    'JPM',    # JPMorgan Chase - Financial
+    'WMT',    # Walmart - Consumer Defensive
+    'MA',     # Mastercard - Financial Services
+    'JNJ',    # Johnson & Johnson - Healthcare
+    'XOM',    # Exxon Mobil - Energy
+    'PG',     # Procter & Gamble - Consumer Defensive
+    'HD',     # Home Depot - Consumer Cyclical
+    'COST',   # Costco - Consumer Defensive
+    'ABBV',   # AbbVie - Healthcare
+    'ORCL',   # Oracle - Technology
+    'MRK'     # Merck - Healthcare
+)
+
+# S&P 500 companies to collect first
+SP500_TICKERS = (
+    'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'META', 'TSLA', 'BRK.B', 'LLY', 'V',
+    'JPM', 'WMT', 'MA', 'JNJ', 'XOM', 'PG', 'HD', 'CVX', 'MRK', 'ABBV',
+    'COST', 'ADBE', 'CRM', 'BAC', 'NFLX', 'AMD', 'PEP', 'TMO', 'WFC', 'DIS',
+    'CSCO', 'MCD', 'ABT', 'DHR', 'INTC', 'VZ', 'INTU', 'AMGN', 'IBM', 'CMCSA',
+    'NOW', 'QCOM', 'TXN', 'PM', 'HON', 'RTX', 'NEE', 'SPGI', 'COP', 'UNP',
+    # Add more S&P 500 tickers as needed
+)
@@ -3,72 +3,138 @@
 Convert embedded JSON files to Parquet format
 """
 
+import logging
 import os
-import json
-import glob
-import pandas as pd
+import sys
+from itertools import islice
+from multiprocessing import Pool
+import ijson
 import pyarrow as pa
 import pyarrow.parquet as pq
 import numpy as np
 from tqdm import tqdm
 
-def convert_json_to_parquet(json_path):
-    """Convert a single embedded JSON file to Parquet"""
-    print(f"\nConverting: {json_path}")
+# Per-file details go to the log; set LOG_LEVEL=WARNING to silence them in bulk runs.
+# Read directly rather than via config, which requires the API credentials.
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
+logger = logging.getLogger(__name__)
+
+# Parquet codec; zstd gives a better ratio than snappy at similar speed.
+# Set PARQUET_COMPRESSION=snappy/none to match the deployment's storage.
+PARQUET_COMPRESSION = os.getenv('PARQUET_COMPRESSION', 'zstd')
+PARQUET_COMPRESSION_LEVEL = int(os.getenv('PARQUET_COMPRESSION_LEVEL', '3'))
+# Chunks decoded and written per row group
+PARQUET_BATCH_SIZE = int(os.getenv('PARQUET_BATCH_SIZE', '8192'))
+
+def parquet_schema(dim):
+    """Column layout of the embedded Parquet files for `dim`-sized embeddings"""
+    return pa.schema([
+        pa.field('chunk_id', pa.string()),
+        pa.field('chunk_index', pa.int64()),
+        pa.field('section', pa.string()),
+        pa.field('text', pa.string()),
+        # Fixed-size float32 vectors: no offsets array, half the bytes of float64
+        pa.field('embedding', pa.list_(pa.float32(), dim)),
+        pa.field('word_count', pa.int64()),
+        pa.field('ticker', pa.string()),
+        pa.field('filing_date', pa.string()),
+    ])
+
+def _record_batch(chunks, schema, dim):
+    """Build one RecordBatch from a list of chunk dicts"""
+    # Embeddings go into one contiguous float32 buffer instead of per-row lists
+    flat = np.fromiter(
+        (v for chunk in chunks for v in chunk['embedding']),
+        dtype=np.float32, count=len(chunks) * dim
+    )
     
-    # Load JSON data
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # Build the other columns in a single pass, without a DataFrame in between
+    columns = {name: [] for name in schema.names if name != 'embedding'}
+    for chunk in chunks:
+        metadata = chunk['metadata']
+        columns['chunk_id'].append(metadata['chunk_id'])
+        columns['chunk_index'].append(metadata['chunk_index'])
+        columns['section'].append(metadata['section'])
+        columns['text'].append(chunk['text'])
+        columns['word_count'].append(metadata['word_count'])
+        columns['ticker'].append(metadata['ticker'])
+        columns['filing_date'].append(metadata['filing_date'])
     
-    chunks = data['chunks']
+    columns['embedding'] = pa.FixedSizeListArray.from_arrays(pa.array(flat), dim)
+    
+    return pa.RecordBatch.from_pydict(
+        {name: columns[name] for name in schema.names}, schema=schema
+    )
+
+def convert_json_to_parquet(json_path):
+    """Convert a single embedded JSON file to Parquet
+    
+    Chunks are decoded incrementally and written PARQUET_BATCH_SIZE at a
+    time, so peak memory is bounded by the batch size, not the file size.
+    """
+    logger.info(f"Converting: {json_path}")
     
-    # Create records for DataFrame
-    records = []
-    for chunk in chunks:
-        record = {
-            'chunk_id': chunk['metadata']['chunk_id'],
-            'chunk_index': chunk['metadata']['chunk_index'],
-            'section': chunk['metadata']['section'],
-            'text': chunk['text'],
-            'embedding': chunk['embedding'],
-            'word_count': chunk['metadata']['word_count'],
-            'ticker': chunk['metadata']['ticker'],
-            'filing_date': chunk['metadata']['filing_date']
-        }
-        records.append(record)
-    
-    df = pd.DataFrame(records)
-    
-    # Create Parquet table
-    table = pa.table({
-        'chunk_id': df['chunk_id'].values,
-        'chunk_index': df['chunk_index'].values,
-        'section': df['section'].values,
-        'text': df['text'].values,
-        'embedding': df['embedding'].tolist(),  # Store as list of lists
-        'word_count': df['word_count'].values,
-        'ticker': df['ticker'].values,
-        'filing_date': df['filing_date'].values
-    })
-    
-    # Save Parquet file
     parquet_path = json_path.replace('.json', '.parquet')
-    pq.write_table(table, parquet_path, compression='snappy')
+    compression_level = (
+        PARQUET_COMPRESSION_LEVEL if PARQUET_COMPRESSION in ('zstd', 'gzip', 'brotli') else None
+    )
+    
+    with open(json_path, 'rb') as f:
+        chunks = ijson.items(f, 'chunks.item', use_float=True)
+        batch = list(islice(chunks, PARQUET_BATCH_SIZE))
+        
+        # The embedding width is only known once the first chunk is decoded
+        dim = len(batch[0]['embedding']) if batch else 0
+        schema = parquet_schema(dim)
+        
+        with pq.ParquetWriter(parquet_path, schema,
+                              compression=PARQUET_COMPRESSION,
+                              compression_level=compression_level,
+                              use_dictionary=['ticker', 'section'],
+                              # Split float bytes into streams before compressing the vectors
+                              use_byte_stream_split=['embedding.list.element'],
+                              # Sequential / small integers delta-encode to a few bits each
+                              column_encoding={'chunk_index': 'DELTA_BINARY_PACKED',
+                                               'word_count': 'DELTA_BINARY_PACKED'},
+                              data_page_size=1 << 20,
+                              dictionary_pagesize_limit=1 << 20) as writer:
+            while batch:
+                writer.write_batch(_record_batch(batch, schema, dim))
+                batch = list(islice(chunks, PARQUET_BATCH_SIZE))
     
     # Log file sizes
     json_size = os.path.getsize(json_path) / (1024 * 1024)  # MB
     parquet_size = os.path.getsize(parquet_path) / (1024 * 1024)  # MB
     
-    print(f"✓ JSON size: {json_size:.2f} MB")
-    print(f"✓ Parquet size: {parquet_size:.2f} MB (compression ratio: {json_size/parquet_size:.1f}x)")
+    logger.info(f"✓ {parquet_path}: {json_size:.2f} MB JSON -> {parquet_size:.2f} MB Parquet")
+    
+    return parquet_path, json_size, parquet_size
+
+def _convert_file(json_path):
+    """Pool worker: convert one file, returning None if it fails"""
+    try:
+        return convert_json_to_parquet(json_path)
+    except Exception as e:
+        logger.error(f"Error converting {json_path}: {e}")
+        return None
+
+def find_embedded_json_files(output_dir="output", prefix="MSFT_"):
+    """Find output/<prefix>*/*_embedded.json files in one scandir pass per directory"""
+    with os.scandir(output_dir) as roots:
+        filing_dirs = [root.path for root in roots
+                       if root.name.startswith(prefix) and root.is_dir()]
     
-    return parquet_path
+    json_files = []
+    for filing_dir in filing_dirs:
+        with os.scandir(filing_dir) as entries:
+            json_files.extend(entry.path for entry in entries
+                              if entry.name.endswith('_embedded.json'))
+    return json_files
 
 def main():
     """Convert all embedded JSON files to Parquet"""
     # Find all embedded JSON files
-    pattern = "output/MSFT_*/*_embedded.json"
-    json_files = glob.glob(pattern)
+    json_files = find_embedded_json_files()
     
     if not json_files:
         print("No embedded JSON files found")
@@ -76,20 +142,26 @@ def main():
     
     print(f"Found {len(json_files)} embedded JSON files to convert")
     
-    # Convert each file
-    parquet_files = []
-    for json_file in tqdm(json_files, desc="Converting files"):
-        try:
-            parquet_path = convert_json_to_parquet(json_file)
-            parquet_files.append(parquet_path)
-        except Exception as e:
-            print(f"\nError converting {json_file}: {e}")
+    # Convert files in parallel; each one is independent and CPU-bound
+    with Pool(os.cpu_count()) as pool:
+        results = [
+            result for result in tqdm(
+                pool.imap_unordered(_convert_file, json_files),
+                total=len(json_files), desc="Converting files",
+                # Throttle redraws, and skip the bar entirely when not on a terminal
+                mininterval=1.0, disable=not sys.stderr.isatty()
+            )
+            if result is not None
+        ]
     
-    print(f"\n✓ Successfully converted {len(parquet_files)} files to Parquet format")
+    print(f"\n✓ Successfully converted {len(results)} files to Parquet format")
+    
+    if not results:
+        return
     
-    # Show total size savings
-    total_json_size = sum(os.path.getsize(f) / (1024 * 1024) for f in json_files)
-    total_parquet_size = sum(os.path.getsize(f) / (1024 * 1024) for f in parquet_files if os.path.exists(f))
+    # Show total size savings for the converted files
+    total_json_size = sum(json_size for _, json_size, _ in results)
+    total_parquet_size = sum(parquet_size for _, _, parquet_size in results)
     
     print(f"\nTotal JSON size: {total_json_size:.2f} MB")
     print(f"Total Parquet size: {total_parquet_size:.2f} MB")
@@ -1,13 +1,21 @@
 """Database operations for Balance Sheets Backend"""
+import csv
+import io
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Set
 from datetime import datetime
-from decimal import Decimal
+import orjson
 import psycopg2
-from psycopg2.extras import RealDictCursor, Json
+import zstandard
+from psycopg2.extras import RealDictCursor, Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from contextlib import contextmanager
 
-from config import SUPABASE_URL, SUPABASE_KEY, DATABASE_URL, DB_SCHEMA
+from config import (
+    SUPABASE_URL, SUPABASE_KEY, DATABASE_URL,
+    DB_POOL_MIN_CONN, DB_POOL_MAX_CONN
+)
 from models import (
     Company, FinancialSnapshot, MarketData, 
     CompanyMetrics, DataFetchLog, AnnualReport, SQL_CREATE_TABLES
@@ -15,6 +23,101 @@ from models import (
 
 logger = logging.getLogger(__name__)
 
+# zstd level for raw API responses: JSON with repeated keys compresses well
+# even at a fast level
+RAW_DATA_ZSTD_LEVEL = 3
+
+
+def compress_raw_data(raw_data: Optional[Dict[str, Any]]) -> Optional[bytes]:
+    """Serialize an API response for the raw_data_zst column (zstd-compressed JSON)"""
+    return zstandard.compress(orjson.dumps(raw_data), RAW_DATA_ZSTD_LEVEL) if raw_data else None
+
+
+def decompress_raw_data(blob) -> Optional[Dict[str, Any]]:
+    """Decode a raw_data_zst value read back from financial_snapshots"""
+    return orjson.loads(zstandard.decompress(bytes(blob))) if blob else None
+
+
+def _bytea_csv(blob: Optional[bytes]) -> Optional[str]:
+    """Hex-format bytea literal for COPY ... (FORMAT csv)"""
+    return None if blob is None else '\\x' + blob.hex()
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers which statements it has PREPAREd
+    
+    Prepared statements live for the whole server session, so a statement
+    only needs to be parsed and planned once per connection.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def execute_prepared(cur, name: str, statement: str, params: tuple):
+    """Execute `statement` (using $1..$n placeholders) as a server-side prepared statement
+    
+    The statement is PREPAREd the first time `name` is used on the cursor's
+    connection, which must be a PreparedConnection; later calls only EXECUTE.
+    """
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {statement}")
+        conn.prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name}({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    """ThreadedConnectionPool that waits for a free connection instead of raising"""
+    
+    def __init__(self, minconn: int, maxconn: int, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+    
+    def getconn(self, key=None):
+        self._slots.acquire()
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+    
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+def _snapshot_key(snapshot: FinancialSnapshot) -> tuple:
+    """(company_id, period_end_date, report_type) - the financial_snapshots unique key"""
+    period = snapshot.period_end_date
+    if isinstance(period, datetime):
+        period = period.date()
+    return (snapshot.company_id, period, snapshot.report_type)
+
+
+# One pool per connection string, shared by every Database instance
+_pools: Dict[str, BlockingConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(connection_string: str) -> BlockingConnectionPool:
+    """Get (or lazily create) the shared pool for a connection string"""
+    with _pools_lock:
+        pool = _pools.get(connection_string)
+        if pool is None:
+            pool = BlockingConnectionPool(
+                DB_POOL_MIN_CONN, DB_POOL_MAX_CONN, connection_string,
+                connection_factory=PreparedConnection
+            )
+            _pools[connection_string] = pool
+        return pool
+
 
 class Database:
     """Handle all database operations"""
@@ -42,19 +145,59 @@ class Database:
         
     @contextmanager
     def get_connection(self):
-        """Get a database connection with context manager"""
-        conn = None
+        """Get a pooled database connection with context manager
+        
+        Connections come from a pool shared by all Database instances, so
+        only the first call pays for the TCP/TLS handshake. Anything left
+        uncommitted is rolled back before the connection goes back.
+        """
+        pool = _get_pool(self.connection_string)
+        conn = pool.getconn()
         try:
-            conn = psycopg2.connect(self.connection_string)
             yield conn
         except Exception as e:
-            if conn:
-                conn.rollback()
             logger.error(f"Database connection error: {e}")
             raise
         finally:
-            if conn:
-                conn.close()
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            # Drop broken connections instead of handing them out again
+            pool.putconn(conn, close=bool(conn.closed))
+    
+    def close(self):
+        """Close all pooled connections for this database"""
+        with _pools_lock:
+            pool = _pools.pop(self.connection_string, None)
+        if pool is not None:
+            pool.closeall()
+    
+    @contextmanager
+    def transaction(self):
+        """Run several operations on one connection, committing once on exit
+        
+        Pass the yielded connection as `conn` to the insert/update methods;
+        they then skip their own commit. Rolls back if anything fails.
+        """
+        with self.get_connection() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    @contextmanager
+    def _use_connection(self, conn=None):
+        """Yield the caller's connection, or a new one that is committed on success"""
+        if conn is not None:
+            yield conn
+            return
+        with self.get_connection() as own_conn:
+            yield own_conn
+            own_conn.commit()
     
     def create_tables(self):
         """Create all database tables"""
@@ -64,37 +207,73 @@ class Database:
                 conn.commit()
                 logger.info("Database tables created successfully")
     
-    def insert_company(self, company: Company) -> int:
-        """Insert or update a company and return its ID"""
-        with self.get_connection() as conn:
+    def _select_company_id(self, cur, ticker: str) -> int:
+        """Look up the ID of an existing company (RealDictCursor)"""
+        execute_prepared(cur, 'select_company_id', """
+            SELECT id FROM companies WHERE ticker = $1
+        """, (ticker,))
+        return cur.fetchone()['id']
+    
+    def insert_company(self, company: Company, conn=None) -> int:
+        """Insert or update a company and return its ID
+        
+        Rows whose values are unchanged are left alone, so refresh runs
+        don't leave a dead tuple behind for every company.
+        """
+        with self._use_connection(conn) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
+                execute_prepared(cur, 'insert_company', """
                     INSERT INTO companies (ticker, name, sector, industry, logo_url)
-                    VALUES (%s, %s, %s, %s, %s)
+                    VALUES ($1, $2, $3, $4, $5)
                     ON CONFLICT (ticker) 
                     DO UPDATE SET
                         name = EXCLUDED.name,
                         sector = EXCLUDED.sector,
                         industry = EXCLUDED.industry,
                         logo_url = EXCLUDED.logo_url
+                    WHERE (companies.name, companies.sector, companies.industry, companies.logo_url)
+                        IS DISTINCT FROM
+                        (EXCLUDED.name, EXCLUDED.sector, EXCLUDED.industry, EXCLUDED.logo_url)
                     RETURNING id
                 """, (company.ticker, company.name, company.sector, 
                       company.industry, company.logo_url))
                 
                 result = cur.fetchone()
-                conn.commit()
+                if result is None:
+                    # Unchanged row: the WHERE skipped the update, so nothing was returned
+                    return self._select_company_id(cur, company.ticker)
+                return result['id']
+    
+    def insert_company_if_absent(self, company: Company, conn=None) -> int:
+        """Insert a company if its ticker is new and return its ID
+        
+        Existing companies are not touched at all (no update, no new tuple).
+        """
+        with self._use_connection(conn) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                execute_prepared(cur, 'insert_company_if_absent', """
+                    INSERT INTO companies (ticker, name, sector, industry, logo_url)
+                    VALUES ($1, $2, $3, $4, $5)
+                    ON CONFLICT (ticker) DO NOTHING
+                    RETURNING id
+                """, (company.ticker, company.name, company.sector, 
+                      company.industry, company.logo_url))
+                
+                result = cur.fetchone()
+                if result is None:
+                    return self._select_company_id(cur, company.ticker)
                 return result['id']
     
-    def insert_financial_snapshot(self, snapshot: FinancialSnapshot) -> int:
+    def insert_financial_snapshot(self, snapshot: FinancialSnapshot, conn=None) -> int:
         """Insert a financial snapshot and return its ID"""
-        with self.get_connection() as conn:
+        with self._use_connection(conn) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
+                execute_prepared(cur, 'insert_financial_snapshot', """
                     INSERT INTO financial_snapshots 
                     (company_id, period_end_date, report_type, assets, liabilities, 
                      equity, cash, debt, revenue, net_income, operating_cash_flow,
-                     free_cash_flow, shares_outstanding, raw_data)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                     free_cash_flow, shares_outstanding, raw_data_zst)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14)
                     ON CONFLICT (company_id, period_end_date, report_type)
                     DO UPDATE SET
                         assets = EXCLUDED.assets,
@@ -107,7 +286,8 @@ class Database:
                         operating_cash_flow = EXCLUDED.operating_cash_flow,
                         free_cash_flow = EXCLUDED.free_cash_flow,
                         shares_outstanding = EXCLUDED.shares_outstanding,
-                        raw_data = EXCLUDED.raw_data
+                        raw_data_zst = EXCLUDED.raw_data_zst,
+                        raw_data = NULL
                     RETURNING id
                 """, (
                     snapshot.company_id, snapshot.period_end_date, snapshot.report_type,
@@ -115,20 +295,171 @@ class Database:
                     snapshot.cash, snapshot.debt, snapshot.revenue,
                     snapshot.net_income, snapshot.operating_cash_flow,
                     snapshot.free_cash_flow, snapshot.shares_outstanding,
-                    Json(snapshot.raw_data) if snapshot.raw_data else None
+                    compress_raw_data(snapshot.raw_data)
                 ))
                 
                 result = cur.fetchone()
-                conn.commit()
                 return result['id']
     
-    def update_market_data(self, market_data: MarketData):
-        """Update or insert market data for a company"""
-        with self.get_connection() as conn:
+    def insert_financial_snapshot_if_absent(self, snapshot: FinancialSnapshot, conn=None) -> int:
+        """Insert a financial snapshot unless one exists for the period; return its ID"""
+        with self._use_connection(conn) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                execute_prepared(cur, 'insert_financial_snapshot_if_absent', """
+                    INSERT INTO financial_snapshots 
+                    (company_id, period_end_date, report_type, assets, liabilities, 
+                     equity, cash, debt, revenue, net_income, operating_cash_flow,
+                     free_cash_flow, shares_outstanding, raw_data_zst)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14)
+                    ON CONFLICT (company_id, period_end_date, report_type) DO NOTHING
+                    RETURNING id
+                """, (
+                    snapshot.company_id, snapshot.period_end_date, snapshot.report_type,
+                    snapshot.assets, snapshot.liabilities, snapshot.equity,
+                    snapshot.cash, snapshot.debt, snapshot.revenue,
+                    snapshot.net_income, snapshot.operating_cash_flow,
+                    snapshot.free_cash_flow, snapshot.shares_outstanding,
+                    compress_raw_data(snapshot.raw_data)
+                ))
+                
+                result = cur.fetchone()
+                if result is None:
+                    execute_prepared(cur, 'select_snapshot_id', """
+                        SELECT id FROM financial_snapshots
+                        WHERE company_id = $1 AND period_end_date = $2 AND report_type = $3
+                    """, (snapshot.company_id, snapshot.period_end_date, snapshot.report_type))
+                    result = cur.fetchone()
+                return result['id']
+    
+    def insert_financial_snapshots(self, snapshots: List[FinancialSnapshot], conn=None) -> List[int]:
+        """Insert or update many financial snapshots in one statement
+        
+        Returns the snapshot IDs in the same order as `snapshots`.
+        """
+        if not snapshots:
+            return []
+        
+        # One INSERT can't update the same row twice, so keep the last
+        # snapshot for each (company, period, report type)
+        unique = {_snapshot_key(snapshot): snapshot for snapshot in snapshots}
+        rows = [
+            (
+                s.company_id, s.period_end_date, s.report_type,
+                s.assets, s.liabilities, s.equity,
+                s.cash, s.debt, s.revenue,
+                s.net_income, s.operating_cash_flow,
+                s.free_cash_flow, s.shares_outstanding,
+                compress_raw_data(s.raw_data)
+            )
+            for s in unique.values()
+        ]
+        
+        with self._use_connection(conn) as conn:
+            with conn.cursor() as cur:
+                returned = execute_values(cur, """
+                    INSERT INTO financial_snapshots 
+                    (company_id, period_end_date, report_type, assets, liabilities, 
+                     equity, cash, debt, revenue, net_income, operating_cash_flow,
+                     free_cash_flow, shares_outstanding, raw_data_zst)
+                    VALUES %s
+                    ON CONFLICT (company_id, period_end_date, report_type)
+                    DO UPDATE SET
+                        assets = EXCLUDED.assets,
+                        liabilities = EXCLUDED.liabilities,
+                        equity = EXCLUDED.equity,
+                        cash = EXCLUDED.cash,
+                        debt = EXCLUDED.debt,
+                        revenue = EXCLUDED.revenue,
+                        net_income = EXCLUDED.net_income,
+                        operating_cash_flow = EXCLUDED.operating_cash_flow,
+                        free_cash_flow = EXCLUDED.free_cash_flow,
+                        shares_outstanding = EXCLUDED.shares_outstanding,
+                        raw_data_zst = EXCLUDED.raw_data_zst,
+                        raw_data = NULL
+                    RETURNING company_id, period_end_date, report_type, id
+                """, rows, page_size=1000, fetch=True)
+        
+        ids = {(company_id, period, report_type): snapshot_id
+               for company_id, period, report_type, snapshot_id in returned}
+        return [ids[_snapshot_key(snapshot)] for snapshot in snapshots]
+    
+    def copy_financial_snapshots(self, snapshots: List[FinancialSnapshot], conn=None) -> int:
+        """Bulk upsert financial snapshots with COPY
+        
+        For large buffered loads: rows are streamed into a temp table with
+        COPY and merged with a single INSERT ... ON CONFLICT. Without a
+        `conn`, the commit is asynchronous (synchronous_commit off): if the
+        database server crashes within a fraction of a second of the commit,
+        the last flush can be lost even though it was reported written. A
+        caller-supplied transaction keeps its own durability. Returns the
+        rows written.
+        """
+        owns_transaction = conn is None
+        if not snapshots:
+            return 0
+        
+        # Same dedup as insert_financial_snapshots
+        unique = {_snapshot_key(snapshot): snapshot for snapshot in snapshots}
+        
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for (company_id, period, report_type), s in unique.items():
+            writer.writerow((
+                company_id, period.isoformat(), report_type,
+                s.assets, s.liabilities, s.equity,
+                s.cash, s.debt, s.revenue,
+                s.net_income, s.operating_cash_flow,
+                s.free_cash_flow, s.shares_outstanding,
+                _bytea_csv(compress_raw_data(s.raw_data))
+            ))
+        buf.seek(0)
+        
+        with self._use_connection(conn) as conn:
             with conn.cursor() as cur:
+                # SET LOCAL would apply to the caller's other writes too
+                if owns_transaction:
+                    cur.execute("SET LOCAL synchronous_commit = off")
+                # A caller-supplied transaction may already hold one from an earlier flush
+                cur.execute("DROP TABLE IF EXISTS tmp_snapshots")
                 cur.execute("""
+                    CREATE TEMP TABLE tmp_snapshots ON COMMIT DROP AS
+                    SELECT company_id, period_end_date, report_type, assets, liabilities,
+                           equity, cash, debt, revenue, net_income, operating_cash_flow,
+                           free_cash_flow, shares_outstanding, raw_data_zst
+                    FROM financial_snapshots
+                    WITH NO DATA
+                """)
+                cur.copy_expert("COPY tmp_snapshots FROM STDIN WITH (FORMAT csv)", buf)
+                cur.execute("""
+                    INSERT INTO financial_snapshots 
+                    (company_id, period_end_date, report_type, assets, liabilities, 
+                     equity, cash, debt, revenue, net_income, operating_cash_flow,
+                     free_cash_flow, shares_outstanding, raw_data_zst)
+                    SELECT * FROM tmp_snapshots
+                    ON CONFLICT (company_id, period_end_date, report_type)
+                    DO UPDATE SET
+                        assets = EXCLUDED.assets,
+                        liabilities = EXCLUDED.liabilities,
+                        equity = EXCLUDED.equity,
+                        cash = EXCLUDED.cash,
+                        debt = EXCLUDED.debt,
+                        revenue = EXCLUDED.revenue,
+                        net_income = EXCLUDED.net_income,
+                        operating_cash_flow = EXCLUDED.operating_cash_flow,
+                        free_cash_flow = EXCLUDED.free_cash_flow,
+                        shares_outstanding = EXCLUDED.shares_outstanding,
+                        raw_data_zst = EXCLUDED.raw_data_zst,
+                        raw_data = NULL
+                """)
+                return cur.rowcount
+    
+    def update_market_data(self, market_data: MarketData, conn=None):
+        """Update or insert market data for a company"""
+        with self._use_connection(conn) as conn:
+            with conn.cursor() as cur:
+                execute_prepared(cur, 'upsert_market_data', """
                     INSERT INTO market_data (company_id, market_cap, stock_price, last_updated)
-                    VALUES (%s, %s, %s, %s)
+                    VALUES ($1, $2, $3, $4)
                     ON CONFLICT (company_id)
                     DO UPDATE SET
                         market_cap = EXCLUDED.market_cap,
@@ -136,18 +467,16 @@ class Database:
                         last_updated = EXCLUDED.last_updated
                 """, (market_data.company_id, market_data.market_cap,
                       market_data.stock_price, market_data.last_updated))
-                
-                conn.commit()
     
-    def insert_company_metrics(self, metrics: CompanyMetrics):
+    def insert_company_metrics(self, metrics: CompanyMetrics, conn=None):
         """Insert or update company metrics"""
-        with self.get_connection() as conn:
+        with self._use_connection(conn) as conn:
             with conn.cursor() as cur:
-                cur.execute("""
+                execute_prepared(cur, 'upsert_company_metrics', """
                     INSERT INTO company_metrics 
                     (company_id, snapshot_id, p_e_ratio, p_b_ratio, debt_to_equity,
                      current_ratio, roe, difficulty_score, sector_percentile)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
                     ON CONFLICT (company_id, snapshot_id)
                     DO UPDATE SET
                         p_e_ratio = EXCLUDED.p_e_ratio,
@@ -163,28 +492,44 @@ class Database:
                     metrics.current_ratio, metrics.roe,
                     metrics.difficulty_score, metrics.sector_percentile
                 ))
-                
-                conn.commit()
     
-    def log_fetch_attempt(self, log: DataFetchLog):
+    def log_fetch_attempt(self, log: DataFetchLog, conn=None):
         """Log an API fetch attempt"""
-        with self.get_connection() as conn:
+        with self._use_connection(conn) as conn:
             with conn.cursor() as cur:
-                cur.execute("""
+                execute_prepared(cur, 'insert_fetch_log', """
                     INSERT INTO data_fetch_log 
                     (ticker, fetch_timestamp, success, api_calls_used, error_message)
-                    VALUES (%s, %s, %s, %s, %s)
+                    VALUES ($1, $2, $3, $4, $5)
                 """, (log.ticker, log.fetch_timestamp, log.success,
                       log.api_calls_used, log.error_message))
-                
-                conn.commit()
+    
+    def log_fetch_attempts(self, logs: List[DataFetchLog], conn=None):
+        """Log many API fetch attempts in one statement
+        
+        For callers that buffer fetch logs and flush them periodically.
+        """
+        if not logs:
+            return
+        
+        with self._use_connection(conn) as conn:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO data_fetch_log 
+                    (ticker, fetch_timestamp, success, api_calls_used, error_message)
+                    VALUES %s
+                """, [
+                    (log.ticker, log.fetch_timestamp, log.success,
+                     log.api_calls_used, log.error_message)
+                    for log in logs
+                ], page_size=1000)
     
     def get_company_by_ticker(self, ticker: str) -> Optional[Dict[str, Any]]:
         """Get company by ticker"""
         with self.get_connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT * FROM companies WHERE ticker = %s
+                execute_prepared(cur, 'select_company_by_ticker', """
+                    SELECT * FROM companies WHERE ticker = $1
                 """, (ticker,))
                 
                 return cur.fetchone()
@@ -193,35 +538,83 @@ class Database:
         """Get the latest financial snapshot for a company"""
         with self.get_connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
+                execute_prepared(cur, 'select_latest_snapshot', """
                     SELECT * FROM financial_snapshots 
-                    WHERE company_id = %s
+                    WHERE company_id = $1
                     ORDER BY period_end_date DESC
                     LIMIT 1
                 """, (company_id,))
                 
                 return cur.fetchone()
     
+    def get_existing_tickers(self) -> Set[str]:
+        """Get the tickers of all companies already stored
+        
+        Postgres aggregates the tickers into one text[] value, so the result
+        is a single row that psycopg2 parses into a list in C, rather than
+        one Python tuple per company.
+        """
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                execute_prepared(cur, 'select_existing_tickers', """
+                    SELECT array_agg(ticker) FROM companies
+                """, ())
+                
+                # array_agg over no rows is NULL
+                return set(cur.fetchone()[0] or ())
+    
     def get_api_calls_today(self) -> int:
-        """Get the number of API calls made today"""
+        """Get the number of API calls made today
+        
+        This is today's reserve_api_calls total (less any released calls),
+        read with a primary-key lookup.
+        """
         with self.get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT COALESCE(SUM(api_calls_used), 0) as total_calls
-                    FROM data_fetch_log
-                    WHERE DATE(fetch_timestamp) = CURRENT_DATE
-                    AND success = true
-                """)
+                execute_prepared(cur, 'select_api_calls_today', """
+                    SELECT count FROM api_rate_counter WHERE day = CURRENT_DATE
+                """, ())
                 
                 result = cur.fetchone()
                 return result[0] if result else 0
     
-    def insert_or_update_annual_report(self, report: AnnualReport) -> int:
+    def reserve_api_calls(self, calls: int, daily_limit: int, conn=None) -> Optional[int]:
+        """Atomically reserve `calls` API calls against today's quota
+        
+        Returns today's reserved total including these calls, or None (and
+        reserves nothing) if they would take it past `daily_limit`. The check
+        and the increment are one statement, so concurrent workers can't
+        both claim the last of the quota.
+        """
+        with self._use_connection(conn) as conn:
+            with conn.cursor() as cur:
+                execute_prepared(cur, 'reserve_api_calls', """
+                    INSERT INTO api_rate_counter AS counter (day, count)
+                    SELECT CURRENT_DATE, $1::integer WHERE $1::integer <= $2::integer
+                    ON CONFLICT (day) DO UPDATE
+                        SET count = counter.count + EXCLUDED.count
+                        WHERE counter.count + EXCLUDED.count <= $2::integer
+                    RETURNING count
+                """, (calls, daily_limit))
+                
+                result = cur.fetchone()
+                return result[0] if result else None
+    
+    def release_api_calls(self, calls: int, conn=None):
+        """Return `calls` reserved but unspent API calls to today's quota"""
+        with self._use_connection(conn) as conn:
+            with conn.cursor() as cur:
+                execute_prepared(cur, 'release_api_calls', """
+                    UPDATE api_rate_counter SET count = GREATEST(count - $1::integer, 0)
+                    WHERE day = CURRENT_DATE
+                """, (calls,))
+    
+    def insert_or_update_annual_report(self, report: AnnualReport, conn=None) -> int:
         """Insert or update an annual report
         
         Returns the report ID
         """
-        with self.get_connection() as conn:
+        with self._use_connection(conn) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
                     INSERT INTO annual_reports 
@@ -254,7 +647,40 @@ class Database:
                 ))
                 
                 result = cur.fetchone()
-                conn.commit()
+                return result['id']
+    
+    def insert_annual_report_if_absent(self, report: AnnualReport, conn=None) -> int:
+        """Insert an annual report unless one exists for the fiscal year
+        
+        Returns the report ID
+        """
+        with self._use_connection(conn) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    INSERT INTO annual_reports 
+                    (company_id, fiscal_year, filing_date, business_overview,
+                     risk_factors, properties, legal_proceedings, md_and_a,
+                     accounting_policies, revenue_recognition, segment_information,
+                     filing_url, raw_json)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (company_id, fiscal_year) DO NOTHING
+                    RETURNING id
+                """, (
+                    report.company_id, report.fiscal_year, report.filing_date,
+                    report.business_overview, report.risk_factors, report.properties,
+                    report.legal_proceedings, report.md_and_a,
+                    report.accounting_policies, report.revenue_recognition,
+                    report.segment_information, report.filing_url,
+                    Json(report.raw_json) if report.raw_json else None
+                ))
+                
+                result = cur.fetchone()
+                if result is None:
+                    cur.execute("""
+                        SELECT id FROM annual_reports
+                        WHERE company_id = %s AND fiscal_year = %s
+                    """, (report.company_id, report.fiscal_year))
+                    result = cur.fetchone()
                 return result['id']
     
     def get_annual_report(self, company_id: int, fiscal_year: int) -> Optional[Dict[str, Any]]:
@@ -0,0 +1,14 @@
+"""Process-wide Database for utility scripts"""
+from functools import lru_cache
+
+from database import Database
+
+
+@lru_cache(maxsize=None)
+def get_db() -> Database:
+    """Return the process-global Database
+
+    Database connections are pooled, so scripts that run several queries
+    reuse the same TCP/TLS session instead of reconnecting to Supabase.
+    """
+    return Database()
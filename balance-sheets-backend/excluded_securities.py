@@ -3,9 +3,15 @@ List of non-company securities to exclude from the game.
 These are bonds, notes, preferred stocks, warrants, rights, units, and other special securities
 that are not actual operating companies.
 """
+import re
+import sys
+
+import numpy as np
+
+from keyword_matcher import KeywordMatcher
 
 # High confidence exclusions - these definitely should not be in the game
-HIGH_CONFIDENCE_EXCLUSIONS = {
+HIGH_CONFIDENCE_EXCLUSIONS = frozenset(map(sys.intern, {
     'AACBR', 'AACBU', 'ABVEW', 'BC-PA', 'BFRGW', 'BTSGU', 'BULLW', 'CELV',
     'CMRC', 'COLA', 'COLAR', 'CORZZ', 'DAAQU', 'DAICW', 'DHAIW', 'DMAAR',
     'DMAAU', 'DSYWW', 'EBRGF', 'ENGNW', 'ENJ', 'ENO', 'FBYDW', 'FERAR',
@@ -16,7 +22,7 @@ HIGH_CONFIDENCE_EXCLUSIONS = {
     'SHMDW', 'SOJD', 'SOJE', 'STRD', 'STRF', 'TACHU', 'TDACW', 'TVACU',
     'USB-PA', 'USB-PS', 'UYSCU', 'VAL-WT', 'VAPEW', 'WRB-PE', 'WRB-PF',
     'WRB-PG', 'WRB-PH', 'WTGUR'
-}
+}))
 
 # Patterns that indicate non-company securities
 EXCLUSION_PATTERNS = {
@@ -39,6 +45,17 @@ EXCLUSION_PATTERNS = {
     ]
 }
 
+# Precompiled matchers for the patterns above, built once at import
+_SUFFIX_RE = re.compile(
+    '(?:' + '|'.join(map(re.escape, EXCLUSION_PATTERNS['ticker_suffixes'])) + r')\Z'
+)
+# Keywords match anywhere in the name (substring, case-insensitive)
+_NAME_KEYWORDS = KeywordMatcher(EXCLUSION_PATTERNS['name_keywords'])
+_NAME_PATTERN_RE = re.compile(
+    '|'.join(f'(?:{pattern})' for pattern in EXCLUSION_PATTERNS['name_patterns']),
+    re.IGNORECASE
+)
+
 
 def is_excluded_security(ticker: str, name: str = None) -> bool:
     """
@@ -56,29 +73,25 @@ def is_excluded_security(ticker: str, name: str = None) -> bool:
         return True
     
     # Check ticker patterns
-    ticker_upper = ticker.upper()
-    for suffix in EXCLUSION_PATTERNS['ticker_suffixes']:
-        if ticker_upper.endswith(suffix):
-            return True
+    if _SUFFIX_RE.search(ticker.upper()):
+        return True
     
-    # Check name patterns if provided
-    if name:
-        name_upper = name.upper()
-        
-        # Check for keywords
-        for keyword in EXCLUSION_PATTERNS['name_keywords']:
-            if keyword.upper() in name_upper:
-                return True
-        
-        # Check for patterns (like interest rates)
-        import re
-        for pattern in EXCLUSION_PATTERNS['name_patterns']:
-            if re.search(pattern, name, re.IGNORECASE):
-                return True
+    # Check name keywords and patterns (like interest rates) if provided
+    if name and (_NAME_KEYWORDS.search(name) or _NAME_PATTERN_RE.search(name)):
+        return True
     
     return False
 
 
+def _excluded_ticker_mask(tickers: np.ndarray) -> np.ndarray:
+    """Vectorized ticker-only version of is_excluded_security"""
+    mask = np.isin(tickers, list(HIGH_CONFIDENCE_EXCLUSIONS))
+    tickers_upper = np.char.upper(tickers)
+    for suffix in EXCLUSION_PATTERNS['ticker_suffixes']:
+        mask |= np.char.endswith(tickers_upper, suffix)
+    return mask
+
+
 def get_excluded_tickers_from_list(tickers: list) -> list:
     """
     Filter a list of tickers to get only those that should be excluded.
@@ -89,7 +102,8 @@ def get_excluded_tickers_from_list(tickers: list) -> list:
     Returns:
         List of tickers that should be excluded
     """
-    return [ticker for ticker in tickers if is_excluded_security(ticker)]
+    tickers = np.asarray(tickers, dtype=str)
+    return tickers[_excluded_ticker_mask(tickers)].tolist()
 
 
 def get_valid_tickers_from_list(tickers: list) -> list:
@@ -102,7 +116,8 @@ def get_valid_tickers_from_list(tickers: list) -> list:
     Returns:
         List of tickers that are valid operating companies
     """
-    return [ticker for ticker in tickers if not is_excluded_security(ticker)]
+    tickers = np.asarray(tickers, dtype=str)
+    return tickers[~_excluded_ticker_mask(tickers)].tolist()
 
 
 # Example usage
@@ -1,41 +1,52 @@
 """Export all companies to a text file for review"""
-import csv
 from database import Database
 
+# Name fragments that might indicate non-companies (case-insensitive regex)
+SUSPICIOUS_NAME_REGEX = (
+    '(WARRANT|RIGHT|UNIT|TRUST|NOTE|BOND|DEBENTURE|SERIES|PREFERRED|PFD|DEP SH|'
+    'DEPOSITARY|CUMULATIVE|PERPETUAL|FIXED RATE|FLOATING|CONVERTIBLE| NT | NTS |'
+    ' SR | JR |DUE 20|%)'
+)
+
 def export_companies():
     db = Database()
     
     try:
         with db.get_connection() as conn:
             with conn.cursor() as cur:
-                # Get all companies ordered by name
-                cur.execute("""
-                    SELECT c.ticker, c.name, c.sector, md.market_cap
-                    FROM companies c
-                    LEFT JOIN market_data md ON c.id = md.company_id
-                    ORDER BY c.name
-                """)
-                
-                results = cur.fetchall()
+                # The LEFT JOIN yields one row per company, so this matches
+                # the number of rows exported below
+                cur.execute("SELECT COUNT(*) FROM companies")
+                total = cur.fetchone()[0]
                 
-                # Write to CSV file for easier review
-                with open('all_companies.csv', 'w', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.writer(csvfile)
-                    writer.writerow(['Ticker', 'Name', 'Sector', 'Market Cap'])
-                    
-                    for ticker, name, sector, market_cap in results:
-                        market_cap_str = f"${market_cap:,.0f}" if market_cap else "N/A"
-                        writer.writerow([ticker, name, sector or 'N/A', market_cap_str])
+                # Stream the CSV straight out of Postgres; formatting happens
+                # server-side instead of once per row in Python
+                with open('all_companies.csv', 'wb') as csvfile:
+                    cur.copy_expert("""
+                        COPY (
+                            SELECT c.ticker AS "Ticker",
+                                   c.name AS "Name",
+                                   COALESCE(c.sector, 'N/A') AS "Sector",
+                                   COALESCE('$' || to_char(NULLIF(md.market_cap, 0), 'FM999,999,999,999,999'), 'N/A') AS "Market Cap"
+                            FROM companies c
+                            LEFT JOIN market_data md ON c.id = md.company_id
+                            ORDER BY c.name
+                        ) TO STDOUT WITH CSV HEADER
+                    """, csvfile)
                 
                 # Also write a simple text file with just ticker and name
-                with open('all_companies.txt', 'w', encoding='utf-8') as txtfile:
-                    txtfile.write(f"Total companies: {len(results)}\n")
-                    txtfile.write("="*80 + "\n\n")
-                    
-                    for ticker, name, sector, market_cap in results:
-                        txtfile.write(f"{ticker:10} | {name}\n")
+                with open('all_companies.txt', 'wb') as txtfile:
+                    txtfile.write(f"Total companies: {total}\n".encode('utf-8'))
+                    txtfile.write(("="*80 + "\n\n").encode('utf-8'))
+                    cur.copy_expert("""
+                        COPY (
+                            SELECT rpad(ticker, GREATEST(length(ticker), 10)) || ' | ' || name
+                            FROM companies
+                            ORDER BY name
+                        ) TO STDOUT (FORMAT text)
+                    """, txtfile)
                 
-                print(f"Exported {len(results)} companies to:")
+                print(f"Exported {total} companies to:")
                 print("  - all_companies.csv (full details)")
                 print("  - all_companies.txt (simple list)")
                 
@@ -43,19 +54,20 @@ def export_companies():
                 print("\nPotentially suspicious entries to review:")
                 print("-" * 60)
                 
-                suspicious_count = 0
-                for ticker, name, sector, market_cap in results:
-                    # Check for more patterns that might indicate non-companies
-                    if any(pattern in name.upper() for pattern in [
-                        'WARRANT', 'RIGHT', 'UNIT', 'TRUST', 'NOTE', 'BOND', 
-                        'DEBENTURE', 'SERIES', 'PREFERRED', 'PFD', 'DEP SH',
-                        'DEPOSITARY', 'CUMULATIVE', 'PERPETUAL', 'FIXED RATE',
-                        'FLOATING', 'CONVERTIBLE', ' NT ', ' NTS ', ' SR ',
-                        ' JR ', 'DUE 20', '%'
-                    ]):
-                        suspicious_count += 1
-                        if suspicious_count <= 50:  # Limit output
-                            print(f"{ticker:10} | {name[:60]}")
+                # Let Postgres match the names; only the first 50 rows come back,
+                # with the total match count riding along on each row
+                cur.execute("""
+                    SELECT ticker, name, COUNT(*) OVER () AS total
+                    FROM companies
+                    WHERE name ~* %s
+                    ORDER BY name
+                    LIMIT 50
+                """, (SUSPICIOUS_NAME_REGEX,))
+                
+                suspicious = cur.fetchall()
+                suspicious_count = suspicious[0][2] if suspicious else 0
+                for ticker, name, _ in suspicious:
+                    print(f"{ticker:10} | {name[:60]}")
                 
                 if suspicious_count > 50:
                     print(f"... and {suspicious_count - 50} more suspicious entries")
@@ -2,22 +2,28 @@
 Fetch all available companies from FMP and collect 10 years of historical data
 Premium tier: 750 calls/minute
 """
-import time
 import logging
-from typing import List, Dict, Set
+from typing import List, Dict, FrozenSet, Optional, Sequence, Set
 from datetime import datetime
 from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 
+from checkpoint import CheckpointWriter
 from fetcher import FMPClient
 from database import Database
 from fetch_historical import HistoricalDataPipeline
-from pipeline import DataPipeline
-from config import FMP_CALLS_PER_BATCH, FMP_RATE_LIMIT_PER_MINUTE
+from pipeline import DataPipeline, PROCESS_COMPANY_CALLS
+from rate_limiter import TokenBucket
+from config import FMP_CALLS_PER_BATCH, FMP_RATE_LIMIT_BURST
+from constants import SP500_TICKERS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 10 years of annual balance sheet, income and cash flow statements
+HISTORY_CALLS = 3
+
 class CompanyDataCollector:
     """Collects all available company data with rate limiting"""
     
@@ -26,27 +32,25 @@ class CompanyDataCollector:
         self.db = Database()
         self.pipeline = DataPipeline()
         self.historical_pipeline = HistoricalDataPipeline()
-        self.calls_this_minute = 0
-        self.minute_start = time.time()
+        self.rate_limiter = TokenBucket(FMP_CALLS_PER_BATCH, FMP_RATE_LIMIT_BURST)
+        self._checkpoints = CheckpointWriter('collection_progress.json')
         
     def _rate_limit_check(self, calls_needed: int = 1):
         """Ensure we don't exceed rate limits"""
-        current_time = time.time()
+        wait_time = self.rate_limiter.acquire(calls_needed)
+        if wait_time >= 1:
+            logger.info(f"Rate limited for {wait_time:.1f} seconds")
         
-        # Reset counter if a minute has passed
-        if current_time - self.minute_start >= 60:
-            self.calls_this_minute = 0
-            self.minute_start = current_time
-            
-        # If we would exceed the limit, wait
-        if self.calls_this_minute + calls_needed > FMP_CALLS_PER_BATCH:
-            wait_time = 60 - (current_time - self.minute_start)
-            logger.info(f"Rate limit approaching. Waiting {wait_time:.1f} seconds...")
-            time.sleep(wait_time + 1)  # Extra second for safety
-            self.calls_this_minute = 0
-            self.minute_start = time.time()
-            
-        self.calls_this_minute += calls_needed
+    def _discard_statements(self, ticker: str, statements: Future):
+        """Drop a historical prefetch whose company failed
+        
+        Its reserved calls are released if it never started; otherwise it is
+        waited out so its error (if any) is logged rather than lost.
+        """
+        if statements.cancel():
+            self.pipeline.db.release_api_calls(HISTORY_CALLS)
+        elif statements.exception() is not None:
+            logger.warning(f"Historical prefetch for {ticker} failed: {statements.exception()}")
         
     def get_all_available_tickers(self) -> List[str]:
         """Fetch list of all available stock tickers from FMP"""
@@ -54,7 +58,9 @@ class CompanyDataCollector:
         
         # FMP endpoints for different exchanges
         exchanges = ['NYSE', 'NASDAQ', 'AMEX']
-        all_tickers = []
+        us_exchanges = frozenset(exchanges)
+        # Deduplicated as they're collected, across exchanges and the active list
+        all_tickers = set()
         
         for exchange in exchanges:
             self._rate_limit_check(1)
@@ -63,7 +69,7 @@ class CompanyDataCollector:
                 data = self.fmp_client._make_request(f'available-traded/list', 
                                                    params={'exchange': exchange})
                 tickers = [item['symbol'] for item in data if item.get('type') == 'stock']
-                all_tickers.extend(tickers)
+                all_tickers.update(tickers)
                 logger.info(f"Found {len(tickers)} stocks on {exchange}")
             except Exception as e:
                 logger.error(f"Error fetching {exchange} tickers: {e}")
@@ -72,11 +78,8 @@ class CompanyDataCollector:
         self._rate_limit_check(1)
         try:
             active_stocks = self.fmp_client._make_request('stock/list')
-            active_tickers = [stock['symbol'] for stock in active_stocks 
-                            if stock.get('type') == 'stock' and stock.get('exchangeShortName') in ['NYSE', 'NASDAQ', 'AMEX']]
-            
-            # Merge and deduplicate
-            all_tickers = list(set(all_tickers + active_tickers))
+            all_tickers.update(stock['symbol'] for stock in active_stocks 
+                               if stock.get('type') == 'stock' and stock.get('exchangeShortName') in us_exchanges)
             
         except Exception as e:
             logger.error(f"Error fetching active stocks: {e}")
@@ -86,14 +89,19 @@ class CompanyDataCollector:
         
     def get_existing_companies(self) -> Set[str]:
         """Get tickers already in database"""
-        with self.db.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT ticker FROM companies")
-                return {row[0] for row in cur.fetchall()}
+        return self.db.get_existing_tickers()
                 
-    def process_company_batch(self, tickers: List[str], skip_existing: bool = True):
-        """Process a batch of companies with current and historical data"""
-        existing = self.get_existing_companies() if skip_existing else set()
+    def process_company_batch(self, tickers: Sequence[str], skip_existing: bool = True,
+                              existing: Optional[FrozenSet[str]] = None):
+        """Process a batch of companies with current and historical data
+        
+        Pass `existing` to reuse one get_existing_companies() result across
+        batches instead of re-reading the companies table for each one.
+        """
+        if not skip_existing:
+            existing = frozenset()
+        elif existing is None:
+            existing = frozenset(self.get_existing_companies())
         
         # Track progress
         total = len(tickers)
@@ -102,47 +110,65 @@ class CompanyDataCollector:
         
         logger.info(f"Processing {total} companies...")
         
-        for ticker in tickers:
-            if ticker in existing:
-                logger.info(f"Skipping {ticker} - already exists")
-                processed += 1
-                continue
-                
-            try:
-                # Calculate API calls needed
-                # Current data: ~6 calls
-                # Historical data (10 years): ~30 calls (3 per year)
-                total_calls = 36
-                
-                self._rate_limit_check(total_calls)
-                
-                logger.info(f"Processing {ticker} ({processed + 1}/{total})...")
-                
-                # First fetch current data
-                success = self.pipeline.process_company(ticker)
-                
-                if success:
-                    # Then fetch historical data
-                    self.historical_pipeline.fetch_historical_data(
-                        ticker, 
-                        years=10, 
-                        include_quarters=False  # Annual data only to save API calls
+        with ThreadPoolExecutor(max_workers=1) as history_executor:
+            for ticker in tickers:
+                statements = None
+                if ticker in existing:
+                    logger.info(f"Skipping {ticker} - already exists")
+                    processed += 1
+                    continue
+                    
+                try:
+                    # Calculate API calls needed
+                    # Current data: ~6 calls
+                    # Historical data (10 years): ~30 calls (3 per year)
+                    total_calls = 36
+                    
+                    self._rate_limit_check(total_calls)
+                    
+                    logger.info(f"Processing {ticker} ({processed + 1}/{total})...")
+                    
+                    # Reserve the current data and the historical statements
+                    # before any of their calls go out
+                    if not self.pipeline.check_rate_limit(PROCESS_COMPANY_CALLS + HISTORY_CALLS):
+                        logger.warning(f"Daily API limit reached, skipping {ticker}")
+                        failed.append(ticker)
+                        processed += 1
+                        continue
+                    
+                    # Historical statements don't depend on the current data, so
+                    # fetch them in the background while current data is processed
+                    statements = history_executor.submit(
+                        self.historical_pipeline.fetch_statements, ticker, 10
                     )
-                    logger.info(f"Successfully processed {ticker}")
-                else:
-                    logger.warning(f"Failed to process current data for {ticker}")
+                    success = self.pipeline.process_company(ticker, calls_reserved=True)
+                    
+                    if success:
+                        # Store historical data once the company row exists
+                        self.historical_pipeline.fetch_historical_data(
+                            ticker, 
+                            years=10, 
+                            include_quarters=False,  # Annual data only to save API calls
+                            statements=statements
+                        )
+                        logger.info(f"Successfully processed {ticker}")
+                    else:
+                        logger.warning(f"Failed to process current data for {ticker}")
+                        self._discard_statements(ticker, statements)
+                        failed.append(ticker)
+                        
+                except Exception as e:
+                    logger.error(f"Error processing {ticker}: {e}")
+                    if statements is not None:
+                        self._discard_statements(ticker, statements)
                     failed.append(ticker)
                     
-            except Exception as e:
-                logger.error(f"Error processing {ticker}: {e}")
-                failed.append(ticker)
-                
-            processed += 1
-            
-            # Progress update every 10 companies
-            if processed % 10 == 0:
-                logger.info(f"Progress: {processed}/{total} companies processed")
+                processed += 1
                 
+                # Progress update every 10 companies
+                if processed % 10 == 0:
+                    logger.info(f"Progress: {processed}/{total} companies processed")
+                    
         # Summary
         logger.info(f"\nProcessing complete!")
         logger.info(f"Total processed: {processed}")
@@ -172,32 +198,33 @@ class CompanyDataCollector:
         batch_size = 20  # Process 20 companies at a time
         failed_tickers = []
         
+        # Tickers already stored, loaded once for all batches
+        existing = frozenset(self.get_existing_companies())
+        
         for i in range(0, len(all_tickers), batch_size):
             batch = all_tickers[i:i + batch_size]
             logger.info(f"\nProcessing batch {i//batch_size + 1}/{(len(all_tickers) + batch_size - 1)//batch_size}")
             
-            failed = self.process_company_batch(batch)
+            failed = self.process_company_batch(batch, existing=existing)
             failed_tickers.extend(failed)
             
-            # Save progress
+            # Save progress (written in the background)
             self.save_progress(i + len(batch), len(all_tickers), failed_tickers)
             
+        self._checkpoints.flush()
         logger.info("\nCollection complete!")
         return failed_tickers
         
     def save_progress(self, processed: int, total: int, failed: List[str]):
-        """Save progress to file for recovery"""
+        """Queue progress to be saved to file for recovery"""
         progress = {
             'timestamp': datetime.now().isoformat(),
             'processed': processed,
             'total': total,
             'failed_count': len(failed),
-            'failed_tickers': failed
+            'failed_tickers': list(failed)
         }
-        
-        with open('collection_progress.json', 'w') as f:
-            import json
-            json.dump(progress, f, indent=2)
+        self._checkpoints.submit(lambda: progress)
             
     def get_company_stats(self):
         """Get statistics about collected data"""
@@ -241,18 +268,8 @@ def main():
     # failed = collector.collect_all_companies()
     
     # Option 2: Start with S&P 500 companies
-    sp500_tickers = [
-        'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'META', 'TSLA', 'BRK.B', 'LLY', 'V',
-        'JPM', 'WMT', 'MA', 'JNJ', 'XOM', 'PG', 'HD', 'CVX', 'MRK', 'ABBV',
-        'COST', 'ADBE', 'CRM', 'BAC', 'NFLX', 'AMD', 'PEP', 'TMO', 'WFC', 'DIS',
-        'CSCO', 'MCD', 'ABT', 'DHR', 'INTC', 'VZ', 'INTU', 'AMGN', 'IBM', 'CMCSA',
-        'NOW', 'QCOM', 'TXN', 'PM', 'HON', 'RTX', 'NEE', 'SPGI', 'COP', 'UNP',
-        # Add more S&P 500 tickers as needed
-    ]
-    
-    # Process S&P 500 first
     logger.info("Starting with S&P 500 companies...")
-    failed = collector.process_company_batch(sp500_tickers, skip_existing=True)
+    failed = collector.process_company_batch(SP500_TICKERS, skip_existing=True)
     
     # Show statistics
     collector.get_company_stats()
@@ -3,23 +3,44 @@ Fast parallel fetching for premium tier (750 calls/minute)
 Optimized for maximum throughput
 """
 import asyncio
-import aiohttp
+import httpx
+import orjson
 import time
 import logging
-import json
-from typing import List, Dict, Set
+from collections import defaultdict
+from typing import Any, List, Dict, FrozenSet, Optional, Set
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
-import threading
 
+from checkpoint import CheckpointWriter
 from database import Database
+from fetcher import AsyncFMPClient
+from keyword_matcher import KeywordMatcher
+from models import DataFetchLog
 from pipeline import DataPipeline
 from fetch_historical import HistoricalDataPipeline
-from config import FMP_API_KEY, FMP_BASE_URL
+from rate_limiter import TokenBucket
+from config import FMP_API_KEY, FMP_BASE_URL, FMP_CALLS_PER_BATCH, FMP_RATE_LIMIT_BURST
+
+try:
+    import uvloop  # libuv-based event loop, fewer syscalls per socket op
+except ImportError:
+    uvloop = None
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# US exchanges to collect from (including OTC for microcaps)
+US_EXCHANGES = frozenset({'NYSE', 'NASDAQ', 'AMEX', 'OTC', 'OTCBB', 'PINK', 'OTCQX', 'OTCQB'})
+
+# Name fragments of ETFs, funds and other non-company securities (case-sensitive
+# substrings), matched in one automaton pass rather than one `in` test per keyword
+EXCLUDED_NAME_MATCHER = KeywordMatcher(
+    ['ETF', 'Fund', 'Trust', 'ETN', 'Note', 'LP', 'L.P.', 'REIT'], case_sensitive=True
+)
+
+# Buffered historical snapshots are written once this many have accumulated
+SNAPSHOT_FLUSH_ROWS = 5000
+
 class FastCompanyCollector:
     """Maximizes API usage with parallel requests"""
     
@@ -30,33 +51,40 @@ class FastCompanyCollector:
         self.api_key = FMP_API_KEY
         self.base_url = FMP_BASE_URL
         
-        # Rate limiting
-        self.calls_this_minute = 0
-        self.minute_start = time.time()
-        self.rate_limit = 750
-        self.lock = threading.Lock()
+        # Rate limiting. All calls run on one event loop, so the counters
+        # below are only touched from that thread and need no lock.
+        self.rate_limiter = TokenBucket(FMP_CALLS_PER_BATCH, FMP_RATE_LIMIT_BURST)
+        
+        # Historical snapshots waiting to be COPYed in one batch, and the
+        # fetch logs of the tickers they belong to; a ticker only counts as
+        # processed once the flush holding its rows has committed
+        self._snapshot_buf = []
+        self._pending_logs: List[DataFetchLog] = []
+        self._flush_lock = asyncio.Lock()
         
         # Progress tracking
+        self._checkpoints = CheckpointWriter('fast_collection_progress.json')
         self.processed_companies = set()
         self.failed_companies = []
         self.total_api_calls = 0
         
-    async def fetch_all_tickers(self) -> List[str]:
+    async def fetch_all_tickers(self, session: httpx.AsyncClient) -> List[str]:
         """Fetch all available US stock tickers including microcaps"""
-        async with aiohttp.ClientSession() as session:
-            url = f"{self.base_url}/stock/list?apikey={self.api_key}"
-            async with session.get(url) as response:
-                data = await response.json()
+        url = f"{self.base_url}/stock/list?apikey={self.api_key}"
+        # httpx already asks for (and transparently inflates) gzip responses
+        response = await session.get(url)
+        logger.info(f"Connected to FMP over {response.http_version}")
+        data = orjson.loads(response.content)
                 
         # Filter for US stocks only (including OTC for microcaps)
         # Exclude ETFs, mutual funds, and other non-company securities
-        us_exchanges = ['NYSE', 'NASDAQ', 'AMEX', 'OTC', 'OTCBB', 'PINK', 'OTCQX', 'OTCQB']
-        excluded_keywords = ['ETF', 'Fund', 'Trust', 'ETN', 'Note', 'LP', 'L.P.', 'REIT']
-        
+        # Count exchanges while filtering, in the same pass
         us_stocks = []
+        exchange_counts = defaultdict(int)
         for stock in data:
             # Check if it's a US exchange
-            if stock.get('exchangeShortName') not in us_exchanges:
+            exchange = stock.get('exchangeShortName')
+            if exchange not in US_EXCHANGES:
                 continue
                 
             # Must be type 'stock'
@@ -65,7 +93,7 @@ class FastCompanyCollector:
                 
             # Exclude ETFs and funds based on name
             name = stock.get('name', '')
-            if any(keyword in name for keyword in excluded_keywords):
+            if EXCLUDED_NAME_MATCHER.search(name):
                 continue
                 
             # Additional ETF check - they often have 'etf' in symbol
@@ -74,14 +102,8 @@ class FastCompanyCollector:
                 continue
                 
             us_stocks.append(symbol)
+            exchange_counts[exchange] += 1
         
-        # Log breakdown by exchange
-        exchange_counts = {}
-        for stock in data:
-            if stock.get('symbol') in us_stocks:
-                exchange = stock.get('exchangeShortName', 'Unknown')
-                exchange_counts[exchange] = exchange_counts.get(exchange, 0) + 1
-                
         logger.info(f"Found {len(us_stocks)} US company stocks")
         for exchange, count in sorted(exchange_counts.items()):
             logger.info(f"  {exchange}: {count} stocks")
@@ -90,64 +112,174 @@ class FastCompanyCollector:
         
     def check_rate_limit(self, calls_needed: int = 1) -> bool:
         """Check if we can make more calls without exceeding limit"""
-        with self.lock:
-            current_time = time.time()
-            
-            # Reset counter if minute has passed
-            if current_time - self.minute_start >= 60:
-                self.calls_this_minute = 0
-                self.minute_start = current_time
-                
-            # Check if we have capacity
-            if self.calls_this_minute + calls_needed <= self.rate_limit:
-                self.calls_this_minute += calls_needed
-                self.total_api_calls += calls_needed
-                return True
+        if not self.rate_limiter.try_acquire(calls_needed):
             return False
+        self.total_api_calls += calls_needed
+        return True
             
-    def wait_for_rate_limit(self, calls_needed: int = 1):
+    async def wait_for_rate_limit(self, calls_needed: int = 1):
         """Wait if necessary for rate limit"""
-        while not self.check_rate_limit(calls_needed):
-            time.sleep(0.1)  # Check every 100ms
+        # Sleeps exactly until the tokens are there, without blocking the loop
+        await self.rate_limiter.wait(calls_needed)
+        self.total_api_calls += calls_needed
             
-    def process_company_with_history(self, ticker: str) -> bool:
-        """Process a single company with all historical data"""
+    async def bulk_fetch_current(self, client: AsyncFMPClient, tickers: List[str],
+                                 chunk_size: int = 100) -> Dict[str, Dict[str, Any]]:
+        """Fetch profiles and quotes for all tickers with the multi-symbol endpoints
+        
+        Returns {ticker: {'profile': ..., 'quote': ...}}, only holding the
+        parts FMP returned; anything missing is fetched per company later.
+        """
+        async def fetch_chunk(chunk):
+            await self.wait_for_rate_limit(2)
+            return await asyncio.gather(client.get_company_profiles(chunk), client.get_quotes(chunk))
+        
+        chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+        logger.info(f"Bulk fetching profiles and quotes in {len(chunks)} chunks...")
+        results = await asyncio.gather(*map(fetch_chunk, chunks), return_exceptions=True)
+        
+        prefetched = {}
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Bulk fetch failed for {chunk[0]}..{chunk[-1]}: {result}")
+                continue
+            profiles, quotes = result
+            for ticker in chunk:
+                data = {}
+                if ticker in profiles:
+                    data['profile'] = profiles[ticker]
+                if ticker in quotes:
+                    data['quote'] = quotes[ticker]
+                prefetched[ticker] = data
+        return prefetched
+            
+    async def process_company_with_history(self, client: AsyncFMPClient, ticker: str,
+                                           prefetched: Optional[Dict[str, Any]] = None) -> bool:
+        """Process a single company with all historical data
+        
+        HTTP calls are awaited on the event loop; the blocking database
+        writes run in worker threads via asyncio.to_thread. `prefetched`
+        holds this ticker's results from bulk_fetch_current. The historical
+        statements are fetched alongside the current data and only stored
+        once the company row exists.
+        """
+        history = None
         try:
-            # API calls needed: 
-            # - Current data: 6 calls
-            # - Historical (10 years annual): 30 calls
-            total_calls = 36
+            # Current data: profile, balance sheet, income statement, quote, key metrics
+            # (minus whatever the bulk endpoints already returned), plus
+            # 10 years of annual balance sheet, income and cash flow statements
+            calls = AsyncFMPClient.company_data_calls(prefetched) + 3
             
-            # Wait for rate limit
-            self.wait_for_rate_limit(total_calls)
+            # Reserve those plus the 2 annual report calls from the daily quota
+            if not await asyncio.to_thread(self.pipeline.check_rate_limit, calls + 2):
+                logger.warning(f"✗ {ticker} - Daily API limit reached")
+                return False
             
-            # Process current data
-            success = self.pipeline.process_company(ticker)
+            await self.wait_for_rate_limit(calls)
+            history = asyncio.create_task(
+                self.historical_pipeline.fetch_statements_async(ticker, years=10, client=client)
+            )
+            fetch_timestamp = datetime.now()
+            raw_data = await client.fetch_company_data(ticker, prefetched)
+            company_id = await asyncio.to_thread(
+                self.pipeline.process_company_data, ticker, raw_data, fetch_timestamp
+            )
             
-            if success:
-                # Fetch 10 years of historical data
-                self.historical_pipeline.fetch_historical_data(
-                    ticker,
-                    years=10,
-                    include_quarters=False  # Annual only
-                )
-                
-                logger.info(f"✓ {ticker} - Complete with 10 years history")
-                return True
-            else:
+            if company_id is None:
                 logger.warning(f"✗ {ticker} - Failed current data")
                 return False
+            
+            # Latest 10-K: filings list + parsed report (optional, failures are logged)
+            await self.wait_for_rate_limit(2)
+            report_data = await client.fetch_annual_report(ticker)
+            await asyncio.to_thread(self.pipeline.store_annual_report, ticker, company_id, report_data)
+            
+            # Completion is reported by the flush that writes the history
+            return await self.store_history(ticker, company_id, history)
                 
         except Exception as e:
             logger.error(f"✗ {ticker} - Error: {str(e)}")
             return False
             
-    def parallel_process_companies(self, tickers: List[str], max_workers: int = 20):
-        """Process companies in parallel using thread pool"""
-        logger.info(f"Processing {len(tickers)} companies with {max_workers} workers...")
+        finally:
+            # Don't leave the history fetch running (or its error unretrieved)
+            # for a company we gave up on
+            if history is not None:
+                if not history.done():
+                    history.cancel()
+                elif not history.cancelled():
+                    history.exception()
+            
+    async def store_history(self, ticker: str, company_id: int, statements: asyncio.Task) -> bool:
+        """Wait for a fetch_statements_async task and buffer its 10-K snapshots
+        
+        Returns False if the fetch failed. On success the ticker is pending
+        until flush_snapshots writes its rows and records the outcome.
+        """
+        fetch_log = DataFetchLog(
+            ticker=ticker,
+            fetch_timestamp=datetime.now(),
+            api_calls_used=3
+        )
+        
+        try:
+            balance_sheets, income_statements, cash_flows = await statements
+        except Exception as e:
+            logger.error(f"Error fetching historical data for {ticker}: {e}")
+            fetch_log.success = False
+            fetch_log.error_message = str(e)
+            await asyncio.to_thread(self.db.log_fetch_attempt, fetch_log)
+            return False
+        
+        self._snapshot_buf.extend(self.historical_pipeline.annual_snapshots(
+            company_id, balance_sheets, income_statements, cash_flows
+        ))
+        self._pending_logs.append(fetch_log)
+        if len(self._snapshot_buf) >= SNAPSHOT_FLUSH_ROWS:
+            await self.flush_snapshots()
+        return True
+            
+    async def flush_snapshots(self):
+        """COPY all buffered historical snapshots into the database
+        
+        The tickers whose rows were in the batch are marked processed if the
+        COPY commits and failed otherwise, with their fetch logs to match.
+        """
+        async with self._flush_lock:
+            snapshots, self._snapshot_buf = self._snapshot_buf, []
+            logs, self._pending_logs = self._pending_logs, []
+            if not logs:
+                return
+            try:
+                written = await asyncio.to_thread(self.db.copy_financial_snapshots, snapshots)
+                logger.info(f"Flushed {written} historical snapshots")
+                for log in logs:
+                    log.success = True
+                    self.processed_companies.add(log.ticker)
+                    logger.info(f"✓ {log.ticker} - Complete with 10 years history")
+            except Exception as e:
+                logger.error(f"Error flushing {len(snapshots)} historical snapshots: {e}")
+                for log in logs:
+                    log.success = False
+                    log.error_message = f"Storing history failed: {e}"
+                    self.failed_companies.append(log.ticker)
+            await asyncio.to_thread(self.db.log_fetch_attempts, logs)
+            
+    async def _process_async(self, client: AsyncFMPClient, ticker: str,
+                             semaphore: asyncio.Semaphore, prefetched: Optional[Dict[str, Any]] = None):
+        """Process one company once a concurrency slot is free"""
+        async with semaphore:
+            return ticker, await self.process_company_with_history(client, ticker, prefetched)
+            
+    async def parallel_process_companies(self, session: httpx.AsyncClient,
+                                         tickers: List[str], existing: FrozenSet[str],
+                                         concurrency: int = 50):
+        """Process companies concurrently on one event loop
+        
+        `existing` is the read-only set of tickers already in the database.
+        """
+        logger.info(f"Processing {len(tickers)} companies with {concurrency} concurrent tasks...")
         
-        # Get existing companies
-        existing = self.get_existing_companies()
         new_tickers = [t for t in tickers if t not in existing]
         logger.info(f"Found {len(new_tickers)} new companies to process")
         
@@ -155,23 +287,24 @@ class FastCompanyCollector:
         completed = 0
         start_time = time.time()
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = []
-            
-            for ticker in new_tickers:
-                future = executor.submit(self.process_company_with_history, ticker)
-                futures.append((ticker, future))
-                
-            # Process results as they complete
-            for ticker, future in futures:
-                try:
-                    success = future.result()
-                    if success:
-                        self.processed_companies.add(ticker)
-                    else:
-                        self.failed_companies.append(ticker)
-                except Exception as e:
-                    logger.error(f"Exception processing {ticker}: {e}")
+        client = AsyncFMPClient(session)
+        
+        # Phase 1: profiles and quotes for every ticker, ~100 symbols per request
+        prefetched = await self.bulk_fetch_current(client, new_tickers)
+        
+        # Phase 2: the per-company statements, 10-K and history
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [
+            asyncio.create_task(self._process_async(client, ticker, semaphore, prefetched.get(ticker)))
+            for ticker in new_tickers
+        ]
+        
+        # Process results as they complete. Successful tickers are marked
+        # processed by flush_snapshots once their history is written.
+        try:
+            for task in asyncio.as_completed(tasks):
+                ticker, success = await task
+                if not success:
                     self.failed_companies.append(ticker)
                     
                 completed += 1
@@ -188,9 +321,13 @@ Rate: {rate:.1f} companies/min, {api_rate:.1f} API calls/min
 Estimated time remaining: {(len(new_tickers) - completed) / rate:.1f} minutes
                     """)
                     
-                    # Save progress
+                    # Save progress (written in the background)
                     self.save_progress()
-                    
+                        
+        finally:
+            # Write whatever is still buffered, even if the run is interrupted
+            await self.flush_snapshots()
+        
         # Final summary
         elapsed = time.time() - start_time
         logger.info(f"""
@@ -204,23 +341,26 @@ Average API rate: {self.total_api_calls/elapsed*60:.1f} calls/min
         
     def get_existing_companies(self) -> Set[str]:
         """Get tickers already in database"""
-        with self.db.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT ticker FROM companies")
-                return {row[0] for row in cur.fetchall()}
+        return self.db.get_existing_tickers()
                 
     def save_progress(self):
-        """Save current progress to file"""
-        progress = {
-            'timestamp': datetime.now().isoformat(),
-            'processed': list(self.processed_companies),
-            'failed': self.failed_companies,
-            'total_api_calls': self.total_api_calls,
-            'stats': self.get_stats()
-        }
+        """Queue a snapshot of current progress to be saved to file
+        
+        The lists are copied here, on the event loop thread; the stats
+        queries and the file write run on the checkpoint writer's thread.
+        """
+        processed = list(self.processed_companies)
+        failed = list(self.failed_companies)
+        total_api_calls = self.total_api_calls
+        timestamp = datetime.now().isoformat()
         
-        with open('fast_collection_progress.json', 'w') as f:
-            json.dump(progress, f, indent=2)
+        self._checkpoints.submit(lambda: {
+            'timestamp': timestamp,
+            'processed': processed,
+            'failed': failed,
+            'total_api_calls': total_api_calls,
+            'stats': self.get_stats()
+        })
             
     def get_stats(self) -> Dict:
         """Get current statistics"""
@@ -245,19 +385,25 @@ Average API rate: {self.total_api_calls/elapsed*60:.1f} calls/min
         
     async def run_async(self):
         """Main async entry point"""
-        # Get all available tickers
-        all_tickers = await self.fetch_all_tickers()
+        # Tickers already stored, loaded once and shared by all tasks
+        existing = frozenset(await asyncio.to_thread(self.get_existing_companies))
         
-        # Save ticker list
-        with open('all_us_stocks.txt', 'w') as f:
-            f.write('\n'.join(all_tickers))
-        logger.info(f"Saved {len(all_tickers)} tickers to all_us_stocks.txt")
-        
-        # Process in parallel
-        self.parallel_process_companies(all_tickers, max_workers=20)
+        # One client (and HTTP/2 connection pool) for the whole run
+        async with AsyncFMPClient.create_session() as session:
+            # Get all available tickers
+            all_tickers = await self.fetch_all_tickers(session)
+            
+            # Save ticker list
+            with open('all_us_stocks.txt', 'w') as f:
+                f.write('\n'.join(all_tickers))
+            logger.info(f"Saved {len(all_tickers)} tickers to all_us_stocks.txt")
+            
+            # Process concurrently
+            await self.parallel_process_companies(session, all_tickers, existing, concurrency=50)
         
         # Save final results
         self.save_progress()
+        await asyncio.to_thread(self._checkpoints.flush)
         
         if self.failed_companies:
             with open('failed_tickers.txt', 'w') as f:
@@ -269,8 +415,11 @@ def main():
     """Run the fast collector"""
     collector = FastCompanyCollector()
     
-    # Run the async collector
-    asyncio.run(collector.run_async())
+    # Run the async collector (on uvloop when it is installed)
+    if uvloop is not None:
+        uvloop.run(collector.run_async())
+    else:
+        asyncio.run(collector.run_async())
     
     # Show final stats
     stats = collector.get_stats()
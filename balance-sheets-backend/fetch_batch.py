@@ -1,7 +1,9 @@
 """Batch fetch companies with historical data"""
 from fetch_historical import HistoricalDataPipeline
 from database import Database
-import time
+from rate_limiter import TokenBucket
+from config import FMP_CALLS_PER_BATCH, FMP_RATE_LIMIT_BURST
+from constants import TOP_COMPANIES
 import logging
 
 logging.basicConfig(
@@ -11,28 +13,11 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Top 20 companies by market cap (diverse sectors)
-COMPANIES_TO_FETCH = [
-    'AAPL',   # Apple - Technology
-    'GOOGL',  # Alphabet - Technology
-    'AMZN',   # Amazon - Consumer Cyclical
-    'NVDA',   # NVIDIA - Technology
-    'META',   # Meta - Technology
-    'TSLA',   # Tesla - Consumer Cyclical
-    'BRK.B',  # Berkshire Hathaway - Financial
-    'LLY',    # Eli Lilly - Healthcare
-    'V',      # Visa - Financial Services
-    'JPM',    # JPMorgan Chase - Financial
-    'WMT',    # Walmart - Consumer Defensive
-    'MA',     # Mastercard - Financial Services
-    'JNJ',    # Johnson & Johnson - Healthcare
-    'XOM',    # Exxon Mobil - Energy
-    'PG',     # Procter & Gamble - Consumer Defensive
-    'HD',     # Home Depot - Consumer Cyclical
-    'COST',   # Costco - Consumer Defensive
-    'ABBV',   # AbbVie - Healthcare
-    'ORCL',   # Oracle - Technology
-    'MRK'     # Merck - Healthcare
-]
+COMPANIES_TO_FETCH = TOP_COMPANIES
+
+# One call per annual statement (balance sheet, income, cash flow), each
+# returning all 5 years
+CALLS_PER_COMPANY = 3
 
 def main():
     pipeline = HistoricalDataPipeline()
@@ -42,16 +27,22 @@ def main():
     starting_calls = db.get_api_calls_today()
     logger.info(f"Starting with {starting_calls}/250 API calls used today")
     
-    # Estimate: 5 years × 3 statements = 15 API calls per company
-    # 20 companies × 15 calls = 300 calls (but we only have 242 left)
-    # So we'll monitor and stop when approaching limit
+    # 20 companies × 3 calls = 60 calls, plus the current data for any
+    # company not stored yet, so we'll monitor and stop when approaching limit
+    
+    # Pace requests by API budget instead of a fixed pause per company;
+    # fetches that already took a while don't wait at all
+    rate_limiter = TokenBucket(FMP_CALLS_PER_BATCH, FMP_RATE_LIMIT_BURST)
     
     successful = []
     failed = []
     
+    # Track usage locally from the calls each successful fetch logged (the
+    # server's tally only counts those); it is re-read once at the end
+    calls_used = starting_calls
+    
     for i, ticker in enumerate(COMPANIES_TO_FETCH, 1):
         # Check API limit before each company
-        calls_used = db.get_api_calls_today()
         calls_remaining = 250 - calls_used
         
         if calls_remaining < 20:  # Need at least 20 calls for safety
@@ -63,16 +54,19 @@ def main():
         logger.info(f"API calls remaining: {calls_remaining}")
         logger.info(f"{'='*60}")
         
+        rate_limiter.acquire(CALLS_PER_COMPANY)
+        
         try:
             # Fetch 5 years of annual data only (no quarters to save API calls)
-            success = pipeline.fetch_historical_data(
+            calls = pipeline.fetch_historical_data(
                 ticker, 
                 years=5, 
                 include_quarters=False
             )
             
-            if success:
+            if calls is not None:
                 successful.append(ticker)
+                calls_used += calls
                 logger.info(f"✅ Successfully fetched {ticker}")
             else:
                 failed.append(ticker)
@@ -81,9 +75,6 @@ def main():
         except Exception as e:
             logger.error(f"❌ Error processing {ticker}: {e}")
             failed.append(ticker)
-        
-        # Be respectful to the API
-        time.sleep(2)
     
     # Final summary
     final_calls = db.get_api_calls_today()
@@ -1,10 +1,14 @@
 """Fetch historical financial data for companies"""
+import asyncio
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from pipeline import DataPipeline
-from fetcher import FMPClient
-from database import Database
+from fetcher import AsyncFMPClient
 from models import FinancialSnapshot, DataFetchLog
+from rate_limiter import TokenBucket
+from config import FMP_CALLS_PER_BATCH, FMP_RATE_LIMIT_BURST
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,47 +20,42 @@ logger = logging.getLogger(__name__)
 class HistoricalDataPipeline(DataPipeline):
     """Extended pipeline for fetching historical data"""
     
-    def fetch_historical_data(self, ticker: str, years: int = 10, include_quarters: bool = True):
+    def __init__(self):
+        super().__init__()
+        # Runs the blocking statement calls in parallel over self.api_client
+        # (sized to its connection pool)
+        self._statement_executor = ThreadPoolExecutor(max_workers=32)
+    
+    def fetch_historical_data(self, ticker: str, years: int = 10, include_quarters: bool = True,
+                              statements: Optional[Future] = None) -> Optional[int]:
         """Fetch historical financial data for a company
         
+        Returns the API calls this made and logged (including storing the
+        company's current data if it was new), or None on failure.
+        
         Args:
             ticker: Stock ticker symbol
             years: Number of years of history to fetch
             include_quarters: Whether to fetch quarterly (10-Q) data in addition to annual (10-K)
+            statements: Future of a fetch_statements() call (with the same years
+                and include_quarters) already started in parallel with the
+                current-data fetch; the caller has reserved its API calls
         """
         logger.info(f"Starting historical data fetch for {ticker} - {years} years")
         
-        # Check if company exists
-        company = self.db.get_company_by_ticker(ticker)
-        if not company:
-            logger.info(f"Company {ticker} not found, fetching company profile first")
-            success = self.process_company(ticker)
-            if not success:
-                logger.error(f"Failed to fetch company profile for {ticker}")
-                return False
-            company = self.db.get_company_by_ticker(ticker)
-        
-        company_id = company['id']
-        
-        # Calculate API calls needed
-        api_calls_needed = 0
-        if include_quarters:
-            # 4 quarters per year + 1 annual = 5 periods per year
-            # 3 API calls per period (balance sheet + income statement + cash flow)
-            api_calls_needed = years * 5 * 3
-        else:
-            # Just annual reports
-            api_calls_needed = years * 3
+        company_id, company_calls = self._ensure_company(ticker)
+        if company_id is None:
+            return None
         
-        # Check rate limit
-        # Skip rate limit check for premium tier - handled by the fast collector
-        # calls_today = self.db.get_api_calls_today()
-        # if calls_today + api_calls_needed > 250:
-        #     logger.warning(f"Would exceed rate limit. Current: {calls_today}, Needed: {api_calls_needed}")
-        #     logger.warning(f"Can only fetch {(250 - calls_today) // 2} more periods today")
-        #     return False
+        # One call per statement: balance sheet, income statement and cash
+        # flow for the annual reports, balance sheet and income statement for
+        # the quarters
+        api_calls_needed = 5 if include_quarters else 3
+        if statements is None and not self.check_rate_limit(api_calls_needed):
+            logger.error(f"Rate limit exceeded, cannot fetch historical data for {ticker}")
+            return None
         
-        logger.info(f"Estimated API calls needed: {api_calls_needed}")
+        logger.info(f"API calls needed: {api_calls_needed}")
         
         fetch_log = DataFetchLog(
             ticker=ticker,
@@ -65,79 +64,108 @@ class HistoricalDataPipeline(DataPipeline):
         )
         
         try:
-            # Fetch annual data
-            logger.info(f"Fetching {years} years of annual reports")
-            annual_balance_sheets = self.api_client.get_balance_sheet(ticker, 'annual', years)
-            fetch_log.api_calls_used += 1
-            
-            annual_income_statements = self.api_client.get_income_statement(ticker, 'annual', years)
-            fetch_log.api_calls_used += 1
+            # Fetch every statement concurrently (or collect the prefetch
+            # started by the caller)
+            if statements is None:
+                statements = self.fetch_statements(ticker, years, include_quarters)
+            else:
+                statements = statements.result()
             
-            annual_cash_flows = self.api_client.get_cash_flow_statement(ticker, 'annual', years)
-            fetch_log.api_calls_used += 1
-            
-            # Process annual data
-            for i, (bs, income, cf) in enumerate(zip(annual_balance_sheets, annual_income_statements, annual_cash_flows)):
-                logger.info(f"Processing annual report for {bs.get('date')}")
-                
-                snapshot = FinancialSnapshot(
-                    company_id=company_id,
-                    period_end_date=datetime.strptime(bs.get('date'), '%Y-%m-%d'),
-                    report_type='10-K',
-                    assets=bs.get('totalAssets', 0),
-                    liabilities=bs.get('totalLiabilities', 0),
-                    equity=bs.get('totalStockholdersEquity', 0),
-                    cash=bs.get('cashAndCashEquivalents', 0),
-                    debt=bs.get('totalDebt', 0),
-                    revenue=income.get('revenue', 0),
-                    net_income=income.get('netIncome', 0),
-                    operating_cash_flow=cf.get('operatingCashFlow', 0),
-                    free_cash_flow=cf.get('freeCashFlow', 0),
-                    shares_outstanding=income.get('weightedAverageShsOut', 0),
-                    raw_data={'balance_sheet': bs, 'income_statement': income, 'cash_flow': cf}
-                )
-                
-                self.db.insert_financial_snapshot(snapshot)
-            
-            # Fetch quarterly data if requested
-            if include_quarters:
-                quarters_to_fetch = years * 4
-                logger.info(f"Fetching {quarters_to_fetch} quarters of data")
-                
-                quarterly_balance_sheets = self.api_client.get_balance_sheet(ticker, 'quarter', quarters_to_fetch)
-                fetch_log.api_calls_used += 1
-                
-                quarterly_income_statements = self.api_client.get_income_statement(ticker, 'quarter', quarters_to_fetch)
-                fetch_log.api_calls_used += 1
-                
-                # Process quarterly data
-                for bs, income in zip(quarterly_balance_sheets, quarterly_income_statements):
-                    logger.info(f"Processing quarterly report for {bs.get('date')}")
-                    
-                    snapshot = FinancialSnapshot(
-                        company_id=company_id,
-                        period_end_date=datetime.strptime(bs.get('date'), '%Y-%m-%d'),
-                        report_type='10-Q',
-                        assets=bs.get('totalAssets', 0),
-                        liabilities=bs.get('totalLiabilities', 0),
-                        equity=bs.get('totalStockholdersEquity', 0),
-                        cash=bs.get('cashAndCashEquivalents', 0),
-                        debt=bs.get('totalDebt', 0),
-                        revenue=income.get('revenue', 0),
-                        net_income=income.get('netIncome', 0),
-                        shares_outstanding=income.get('weightedAverageShsOut', 0),
-                        raw_data={'balance_sheet': bs, 'income_statement': income}
-                    )
-                    
-                    self.db.insert_financial_snapshot(snapshot)
+            fetch_log.api_calls_used = len(statements)
+            snapshots = self._store_statements(company_id, statements)
             
             fetch_log.success = True
             logger.info(f"Successfully fetched historical data for {ticker}")
             logger.info(f"Total API calls used: {fetch_log.api_calls_used}")
             
             # Print summary
-            self._print_historical_summary(ticker, years, include_quarters)
+            self._print_historical_summary(ticker, snapshots)
+            
+            return company_calls + fetch_log.api_calls_used
             
+        except Exception as e:
+            logger.error(f"Error fetching historical data for {ticker}: {e}")
+            fetch_log.success = False
+            fetch_log.error_message = str(e)
+            return None
+            
+        finally:
+            self.db.log_fetch_attempt(fetch_log)
+    
+    def _ensure_company(self, ticker: str) -> Tuple[Optional[int], int]:
+        """Return the company's ID, storing its current data first if it's new
+        
+        Also returns the API calls storing it logged (0 for a known company).
+        """
+        # process_company records the ID it stores
+        company_id = self._company_ids.get(ticker)
+        if company_id is not None:
+            return company_id, 0
+        
+        company = self.db.get_company_by_ticker(ticker)
+        if company:
+            company_id = self._company_ids[ticker] = company['id']
+            return company_id, 0
+        
+        logger.info(f"Company {ticker} not found, fetching company profile first")
+        # process_company logs its calls (current data and annual report)
+        # across several fetch logs, so read them back from the daily tally
+        calls_before = self.db.get_api_calls_today()
+        if not self.process_company(ticker):
+            logger.error(f"Failed to fetch company profile for {ticker}")
+            return None, 0
+        return self._company_ids[ticker], self.db.get_api_calls_today() - calls_before
+    
+    def _store_statements(self, company_id: int,
+                          statements: Tuple[List[Dict[str, Any]], ...]) -> List[FinancialSnapshot]:
+        """Store a fetch_statements() result as 10-K (and 10-Q) snapshots and return them"""
+        annual_balance_sheets, annual_income_statements, annual_cash_flows = statements[:3]
+        snapshots = self.annual_snapshots(
+            company_id, annual_balance_sheets, annual_income_statements, annual_cash_flows
+        )
+        
+        # Quarterly statements are only present if they were requested
+        if len(statements) > 3:
+            quarterly_balance_sheets, quarterly_income_statements = statements[3:]
+            snapshots.extend(self.quarterly_snapshots(
+                company_id, quarterly_balance_sheets, quarterly_income_statements
+            ))
+        
+        # Store every period in one bulk INSERT (and one transaction)
+        self.db.insert_financial_snapshots(snapshots)
+        return snapshots
+    
+    async def fetch_historical_data_async(self, client: AsyncFMPClient, ticker: str, years: int = 10,
+                                          include_quarters: bool = False,
+                                          rate_limiter: Optional[TokenBucket] = None) -> bool:
+        """fetch_historical_data for an event loop, sharing `client` across tickers
+        
+        Database work runs in worker threads via asyncio.to_thread.
+        """
+        company_id, _ = await asyncio.to_thread(self._ensure_company, ticker)
+        if company_id is None:
+            return False
+        
+        api_calls_needed = 5 if include_quarters else 3
+        if not await asyncio.to_thread(self.check_rate_limit, api_calls_needed):
+            logger.error(f"Rate limit exceeded, cannot fetch historical data for {ticker}")
+            return False
+        
+        fetch_log = DataFetchLog(
+            ticker=ticker,
+            fetch_timestamp=datetime.now(),
+            api_calls_used=0
+        )
+        
+        try:
+            if rate_limiter is not None:
+                await rate_limiter.wait(api_calls_needed)
+            statements = await self.fetch_statements_async(ticker, years, include_quarters, client)
+            fetch_log.api_calls_used = len(statements)
+            await asyncio.to_thread(self._store_statements, company_id, statements)
+            
+            fetch_log.success = True
+            logger.info(f"Successfully fetched historical data for {ticker}")
             return True
             
         except Exception as e:
@@ -147,36 +175,208 @@ class HistoricalDataPipeline(DataPipeline):
             return False
             
         finally:
-            self.db.log_fetch_attempt(fetch_log)
+            await asyncio.to_thread(self.db.log_fetch_attempt, fetch_log)
+    
+    async def fetch_many_async(self, tickers: Sequence[str], years: int = 10,
+                               include_quarters: bool = False, max_concurrency: int = 8) -> Dict[str, bool]:
+        """Fetch historical data for many tickers concurrently
+        
+        At most `max_concurrency` tickers are in progress at once, all over one
+        HTTP session, and API calls are paced by a shared token bucket.
+        Returns whether each ticker succeeded.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        rate_limiter = TokenBucket(FMP_CALLS_PER_BATCH, FMP_RATE_LIMIT_BURST)
+        
+        async with AsyncFMPClient.create_session() as session:
+            client = AsyncFMPClient(session)
+            
+            async def fetch_one(ticker: str) -> bool:
+                async with semaphore:
+                    return await self.fetch_historical_data_async(
+                        client, ticker, years, include_quarters, rate_limiter
+                    )
+            
+            results = await asyncio.gather(*(fetch_one(ticker) for ticker in tickers))
+        
+        succeeded = sum(results)
+        logger.info(f"Fetched historical data for {succeeded}/{len(tickers)} tickers")
+        return dict(zip(tickers, results))
+    
+    def fetch_many(self, tickers: Sequence[str], years: int = 10, include_quarters: bool = False,
+                   max_concurrency: int = 8) -> Dict[str, bool]:
+        """Blocking counterpart of fetch_many_async for synchronous callers
+        
+        Runs fetch_historical_data for up to `max_concurrency` tickers at once
+        in worker threads sharing self.api_client, paced by a shared token
+        bucket. Returns whether each ticker succeeded.
+        """
+        rate_limiter = TokenBucket(FMP_CALLS_PER_BATCH, FMP_RATE_LIMIT_BURST)
+        
+        def fetch_one(ticker: str) -> bool:
+            rate_limiter.acquire(5 if include_quarters else 3)
+            return self.fetch_historical_data(ticker, years, include_quarters) is not None
+        
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            results = list(executor.map(fetch_one, tickers))
+        
+        succeeded = sum(results)
+        logger.info(f"Fetched historical data for {succeeded}/{len(tickers)} tickers")
+        return dict(zip(tickers, results))
+    
+    async def fetch_statements_async(self, ticker: str, years: int = 10, include_quarters: bool = False,
+                                     client: Optional[AsyncFMPClient] = None) -> Tuple[List[Dict[str, Any]], ...]:
+        """Fetch a company's historical statements concurrently
+        
+        Returns the annual balance sheets, income statements and cash flow
+        statements, followed by the quarterly balance sheets and income
+        statements if include_quarters is set (3 or 5 API calls). Without a
+        `client`, a session is opened just for this fetch.
+        """
+        if client is None:
+            async with AsyncFMPClient.create_session() as session:
+                return await self.fetch_statements_async(
+                    ticker, years, include_quarters, AsyncFMPClient(session)
+                )
+        
+        requests = [
+            getattr(client, method)(ticker, period, limit)
+            for method, period, limit in self._statement_calls(ticker, years, include_quarters)
+        ]
+        return tuple(await asyncio.gather(*requests))
+    
+    def fetch_statements(self, ticker: str, years: int = 10,
+                         include_quarters: bool = False) -> Tuple[List[Dict[str, Any]], ...]:
+        """Blocking counterpart of fetch_statements_async
+        
+        The calls run in parallel threads over self.api_client, so they share
+        its HTTP/2 connection, disk cache and retries.
+        """
+        futures = [
+            self._statement_executor.submit(getattr(self.api_client, method), ticker, period, limit)
+            for method, period, limit in self._statement_calls(ticker, years, include_quarters)
+        ]
+        return tuple(future.result() for future in futures)
+    
+    @staticmethod
+    def _statement_calls(ticker: str, years: int, include_quarters: bool) -> List[Tuple[str, str, int]]:
+        """(client method, period, limit) of each call fetch_statements makes, in result order"""
+        if include_quarters:
+            logger.info(f"Fetching {years} years of annual reports and {years * 4} quarters for {ticker}")
+        else:
+            logger.info(f"Fetching {years} years of annual reports for {ticker}")
+        calls = [
+            ('get_balance_sheet', 'annual', years),
+            ('get_income_statement', 'annual', years),
+            ('get_cash_flow_statement', 'annual', years)
+        ]
+        if include_quarters:
+            calls += [
+                ('get_balance_sheet', 'quarter', years * 4),
+                ('get_income_statement', 'quarter', years * 4)
+            ]
+        return calls
+    
+    def annual_snapshots(self, company_id: int, balance_sheets: List[Dict[str, Any]],
+                         income_statements: List[Dict[str, Any]],
+                         cash_flows: List[Dict[str, Any]]) -> List[FinancialSnapshot]:
+        """Build 10-K snapshots from already-fetched annual statements
+        
+        Statements are matched on their period date, so a year missing from
+        one statement drops that year instead of misaligning the rest.
+        """
+        income_by_date = {income.get('date'): income for income in income_statements}
+        cash_flow_by_date = {cf.get('date'): cf for cf in cash_flows}
+        
+        snapshots = []
+        for bs in balance_sheets:
+            date = bs.get('date')
+            income = income_by_date.get(date)
+            cf = cash_flow_by_date.get(date)
+            if income is None or cf is None:
+                continue
+            
+            snapshot = FinancialSnapshot(
+                company_id=company_id,
+                period_end_date=datetime.fromisoformat(date),
+                report_type='10-K',
+                assets=bs.get('totalAssets', 0),
+                liabilities=bs.get('totalLiabilities', 0),
+                equity=bs.get('totalStockholdersEquity', 0),
+                cash=bs.get('cashAndCashEquivalents', 0),
+                debt=bs.get('totalDebt', 0),
+                revenue=income.get('revenue', 0),
+                net_income=income.get('netIncome', 0),
+                operating_cash_flow=cf.get('operatingCashFlow', 0),
+                free_cash_flow=cf.get('freeCashFlow', 0),
+                shares_outstanding=income.get('weightedAverageShsOut', 0),
+                raw_data={'balance_sheet': bs, 'income_statement': income, 'cash_flow': cf}
+            )
+            snapshots.append(snapshot)
+        
+        logger.info(f"Processed {len(snapshots)} annual reports")
+        return snapshots
     
-    def _print_historical_summary(self, ticker: str, years: int, include_quarters: bool):
-        """Print summary of historical data fetched"""
-        with self.db.get_connection() as conn:
-            with conn.cursor() as cur:
-                # Count snapshots
-                cur.execute("""
-                    SELECT 
-                        report_type,
-                        COUNT(*) as count,
-                        MIN(period_end_date) as earliest,
-                        MAX(period_end_date) as latest
-                    FROM financial_snapshots
-                    WHERE company_id = (SELECT id FROM companies WHERE ticker = %s)
-                    GROUP BY report_type
-                """, (ticker,))
-                
-                results = cur.fetchall()
-                
-                print(f"\n{'='*60}")
-                print(f"Historical Data Summary for {ticker}")
-                print(f"{'='*60}")
-                
-                for row in results:
-                    report_type, count, earliest, latest = row
-                    print(f"{report_type} Reports: {count} total")
-                    print(f"  Date range: {earliest} to {latest}")
-                
-                print(f"{'='*60}\n")
+    def quarterly_snapshots(self, company_id: int, balance_sheets: List[Dict[str, Any]],
+                            income_statements: List[Dict[str, Any]]) -> List[FinancialSnapshot]:
+        """Build 10-Q snapshots from already-fetched quarterly statements
+        
+        Statements are matched on their period date, like annual_snapshots.
+        """
+        income_by_date = {income.get('date'): income for income in income_statements}
+        
+        snapshots = []
+        for bs in balance_sheets:
+            date = bs.get('date')
+            income = income_by_date.get(date)
+            if income is None:
+                continue
+            
+            snapshot = FinancialSnapshot(
+                company_id=company_id,
+                period_end_date=datetime.fromisoformat(date),
+                report_type='10-Q',
+                assets=bs.get('totalAssets', 0),
+                liabilities=bs.get('totalLiabilities', 0),
+                equity=bs.get('totalStockholdersEquity', 0),
+                cash=bs.get('cashAndCashEquivalents', 0),
+                debt=bs.get('totalDebt', 0),
+                revenue=income.get('revenue', 0),
+                net_income=income.get('netIncome', 0),
+                shares_outstanding=income.get('weightedAverageShsOut', 0),
+                raw_data={'balance_sheet': bs, 'income_statement': income}
+            )
+            snapshots.append(snapshot)
+        
+        logger.info(f"Processed {len(snapshots)} quarterly reports")
+        return snapshots
+    
+    def _print_historical_summary(self, ticker: str, snapshots: List[FinancialSnapshot]):
+        """Print summary of historical data fetched
+        
+        Aggregated from the snapshots just stored, so it costs no query.
+        """
+        # report_type -> [count, earliest, latest]
+        summary = {}
+        for snapshot in snapshots:
+            date = snapshot.period_end_date.date()
+            entry = summary.get(snapshot.report_type)
+            if entry is None:
+                summary[snapshot.report_type] = [1, date, date]
+            else:
+                entry[0] += 1
+                entry[1] = min(entry[1], date)
+                entry[2] = max(entry[2], date)
+        
+        print(f"\n{'='*60}")
+        print(f"Historical Data Summary for {ticker}")
+        print(f"{'='*60}")
+        
+        for report_type, (count, earliest, latest) in sorted(summary.items()):
+            print(f"{report_type} Reports: {count} total")
+            print(f"  Date range: {earliest} to {latest}")
+        
+        print(f"{'='*60}\n")
 
 
 def main():
@@ -196,6 +396,7 @@ def main():
     print("  pipeline = HistoricalDataPipeline()")
     print("  pipeline.fetch_historical_data('AAPL', years=10, include_quarters=True)")
     print("  pipeline.fetch_historical_data('GOOGL', years=5, include_quarters=False)")
+    print("  pipeline.fetch_many(['AAPL', 'MSFT', 'GOOGL'], years=10)")
 
 
 if __name__ == "__main__":
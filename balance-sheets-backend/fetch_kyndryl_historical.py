@@ -1,12 +1,16 @@
 """Fetch historical data for Kyndryl Holdings"""
-from fetch_historical import HistoricalDataPipeline
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def fetch_kyndryl_data():
     """Fetch all available historical data for Kyndryl"""
+    # Imported here so loading this module doesn't pull in the whole
+    # pipeline (requests, psycopg2, ...) until a fetch actually runs
+    from fetch_historical import HistoricalDataPipeline
+    from database import Database
+    
+    logging.basicConfig(level=logging.INFO)
     pipeline = HistoricalDataPipeline()
     
     logger.info("Fetching historical data for Kyndryl Holdings (KD)...")
@@ -21,7 +25,6 @@ def fetch_kyndryl_data():
             logger.info("Successfully fetched historical data for Kyndryl")
             
             # Check what we have now
-            from database import Database
             db = Database()
             with db.get_connection() as conn:
                 with conn.cursor() as cur:
@@ -1,18 +1,85 @@
-"""Financial Modeling Prep API client"""
+"""Financial Modeling Prep API clients (blocking and asyncio)"""
+import asyncio
 import logging
+import random
 import time
 from typing import Dict, Any, Optional, List
 from datetime import datetime
-import requests
+import diskcache
+import httpx
+import orjson
 from decimal import Decimal
+from urllib.parse import urlencode
 
 from config import (
     FMP_API_KEY, FMP_BASE_URL, FMP_RETRY_ATTEMPTS, 
-    FMP_RETRY_DELAY, FMP_RATE_LIMIT_PER_DAY
+    FMP_RETRY_DELAY, FMP_RATE_LIMIT_PER_DAY,
+    FMP_CACHE_DIR, FMP_CACHE_TTL, FMP_CACHE_DEFAULT_TTL
 )
 
 logger = logging.getLogger(__name__)
 
+# Exponential backoff base per retry attempt, scaled by random jitter in
+# _retry_delay so concurrent callers that fail together don't retry together
+RETRY_BACKOFF = tuple(FMP_RETRY_DELAY * (2 ** attempt) for attempt in range(FMP_RETRY_ATTEMPTS))
+
+# Longest Retry-After (seconds) honored; FMP's limits are per minute
+MAX_RETRY_AFTER = 60
+
+
+def _retry_delay(attempt: int, response=None) -> float:
+    """Seconds to wait before retrying a failed request
+    
+    A 429 with a Retry-After (in seconds) is honored up to MAX_RETRY_AFTER;
+    anything else gets the jittered backoff for the attempt.
+    """
+    if response is not None and response.status_code == 429:
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return min(float(retry_after), MAX_RETRY_AFTER)
+    return RETRY_BACKOFF[attempt] * (0.5 + random.random())
+
+
+# (parsed field, FMP key-metrics field)
+METRIC_FIELDS = (
+    ('p_e_ratio', 'peRatio'),
+    ('p_b_ratio', 'pbRatio'),
+    ('debt_to_equity', 'debtToEquity'),
+    ('current_ratio', 'currentRatio'),
+    ('roe', 'roe'),
+)
+
+
+def _to_decimal(value) -> Decimal:
+    """Convert an FMP number to Decimal, treating null as 0
+    
+    Ints (most statement amounts) convert directly; floats go through str()
+    so 0.1 becomes Decimal('0.1') rather than its exact binary expansion.
+    """
+    if value is None:
+        return Decimal(0)
+    if isinstance(value, float):
+        return Decimal(str(value))
+    return Decimal(value)
+
+
+def _open_cache() -> Optional[diskcache.Cache]:
+    """The on-disk response cache shared by both clients, if FMP_CACHE_DIR is set"""
+    return diskcache.Cache(FMP_CACHE_DIR) if FMP_CACHE_DIR else None
+
+
+def _cache_key(endpoint: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Cache key for a request
+    
+    The API key is left out, so rotating it keeps the cache.
+    """
+    return f"{endpoint}?{urlencode(sorted((params or {}).items()))}"
+
+
+def _cache_ttl(endpoint: str) -> int:
+    """Seconds a response from `endpoint` stays cached (see FMP_CACHE_TTL)"""
+    return FMP_CACHE_TTL.get(endpoint.split('/', 1)[0], FMP_CACHE_DEFAULT_TTL)
+
 
 class FMPClient:
     """Client for Financial Modeling Prep API"""
@@ -20,17 +87,34 @@ class FMPClient:
     def __init__(self):
         self.api_key = FMP_API_KEY
         self.base_url = FMP_BASE_URL
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Balance-Sheets-Backend/1.0'
-        })
+        # HTTP/2 multiplexes calls from threads sharing this client as streams
+        # on one warm TLS connection; the pool only grows past that if the
+        # server falls back to HTTP/1.1
+        self.session = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+            timeout=httpx.Timeout(60.0),
+            headers={'User-Agent': 'Balance-Sheets-Backend/1.0'},
+            # Sent with every request; per-call params are merged in by httpx
+            params={'apikey': self.api_key}
+        )
+        # Responses are kept on disk so repeated runs don't spend API quota
+        self.cache = _open_cache()
     
-    def _make_request(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Make a request to the FMP API with retry logic"""
-        if params is None:
-            params = {}
+    def _make_request(self, endpoint: str, params: Optional[Dict[str, Any]] = None,
+                      bypass_cache: bool = False) -> Dict[str, Any]:
+        """Make a request to the FMP API with retry logic
+        
+        Successful responses are cached for the endpoint's FMP_CACHE_TTL;
+        pass bypass_cache=True to force a fresh request (the new response
+        still replaces the cached one).
+        """
+        key = _cache_key(endpoint, params)
+        if self.cache is not None and not bypass_cache:
+            data = self.cache.get(key)
+            if data is not None:
+                return data
         
-        params['apikey'] = self.api_key
         url = f"{self.base_url}/{endpoint}"
         
         for attempt in range(FMP_RETRY_ATTEMPTS):
@@ -39,20 +123,22 @@ class FMPClient:
                 response = self.session.get(url, params=params)
                 response.raise_for_status()
                 
-                data = response.json()
+                data = orjson.loads(response.content)
                 
                 # Check for API errors
                 if isinstance(data, dict) and 'Error Message' in data:
                     raise Exception(f"API Error: {data['Error Message']}")
                 
+                if self.cache is not None:
+                    self.cache.set(key, data, expire=_cache_ttl(endpoint))
                 return data
                 
-            except requests.exceptions.RequestException as e:
+            except (httpx.HTTPError, orjson.JSONDecodeError) as e:
                 logger.warning(f"Request failed (attempt {attempt + 1}/{FMP_RETRY_ATTEMPTS}): {e}")
                 
                 if attempt < FMP_RETRY_ATTEMPTS - 1:
-                    wait_time = FMP_RETRY_DELAY * (2 ** attempt)  # Exponential backoff
-                    logger.info(f"Waiting {wait_time} seconds before retry...")
+                    wait_time = _retry_delay(attempt, getattr(e, 'response', None))
+                    logger.info(f"Waiting {wait_time:.1f} seconds before retry...")
                     time.sleep(wait_time)
                 else:
                     raise
@@ -293,36 +379,306 @@ class FMPClient:
             parsed['balance_sheet'] = {
                 'period_end_date': bs.get('date'),
                 'report_type': '10-K' if bs.get('period') == 'FY' else '10-Q',
-                'assets': Decimal(str(bs.get('totalAssets', 0))),
-                'liabilities': Decimal(str(bs.get('totalLiabilities', 0))),
-                'equity': Decimal(str(bs.get('totalStockholdersEquity', 0))),
-                'cash': Decimal(str(bs.get('cashAndCashEquivalents', 0))),
-                'debt': Decimal(str(bs.get('totalDebt', 0)))
+                'assets': _to_decimal(bs.get('totalAssets')),
+                'liabilities': _to_decimal(bs.get('totalLiabilities')),
+                'equity': _to_decimal(bs.get('totalStockholdersEquity')),
+                'cash': _to_decimal(bs.get('cashAndCashEquivalents')),
+                'debt': _to_decimal(bs.get('totalDebt'))
             }
         
         # Parse income statement
         if income := data.get('income_statement', {}):
             parsed['income_statement'] = {
-                'revenue': Decimal(str(income.get('revenue', 0))),
-                'net_income': Decimal(str(income.get('netIncome', 0)))
+                'revenue': _to_decimal(income.get('revenue')),
+                'net_income': _to_decimal(income.get('netIncome'))
             }
         
         # Parse quote/market data
         if quote := data.get('quote', {}):
             parsed['market_data'] = {
-                'market_cap': Decimal(str(quote.get('marketCap', 0))),
-                'stock_price': Decimal(str(quote.get('price', 0))),
-                'shares_outstanding': Decimal(str(quote.get('sharesOutstanding', 0)))
+                'market_cap': _to_decimal(quote.get('marketCap')),
+                'stock_price': _to_decimal(quote.get('price')),
+                'shares_outstanding': _to_decimal(quote.get('sharesOutstanding'))
             }
         
-        # Parse key metrics
+        # Parse key metrics (a missing or 0 ratio is stored as None)
         if metrics := data.get('metrics', {}):
             parsed['metrics'] = {
-                'p_e_ratio': Decimal(str(metrics.get('peRatio', 0))) if metrics.get('peRatio') else None,
-                'p_b_ratio': Decimal(str(metrics.get('pbRatio', 0))) if metrics.get('pbRatio') else None,
-                'debt_to_equity': Decimal(str(metrics.get('debtToEquity', 0))) if metrics.get('debtToEquity') else None,
-                'current_ratio': Decimal(str(metrics.get('currentRatio', 0))) if metrics.get('currentRatio') else None,
-                'roe': Decimal(str(metrics.get('roe', 0))) if metrics.get('roe') else None
+                field: _to_decimal(value) if (value := metrics.get(source)) else None
+                for field, source in METRIC_FIELDS
             }
         
-        return parsed
\ No newline at end of file
+        return parsed
+
+
+class AsyncFMPClient:
+    """asyncio counterpart of FMPClient for high-concurrency collection
+    
+    Requests go through a caller-owned httpx.AsyncClient so a single
+    HTTP/2 connection pool is shared for the whole run. Responses have
+    the same shape as FMPClient's, so FMPClient.parse_financial_data and
+    the pipeline store methods work on them unchanged.
+    """
+    
+    # Identical requests made within this window share one response
+    REQUEST_CACHE_TTL = 300  # seconds
+    REQUEST_CACHE_SIZE = 500
+    
+    def __init__(self, session: httpx.AsyncClient):
+        self.api_key = FMP_API_KEY
+        self.base_url = FMP_BASE_URL
+        self.session = session
+        # endpoint+params -> Task of the in-flight or recently finished request
+        self._requests: Dict[str, asyncio.Task] = {}
+        # The same on-disk response cache as FMPClient, read and written in
+        # worker threads so disk I/O stays off the event loop
+        self.cache = _open_cache()
+    
+    @staticmethod
+    def create_session() -> httpx.AsyncClient:
+        """Create a client tuned for many concurrent requests to one host
+        
+        Over HTTP/2 concurrent requests are multiplexed as streams on a few
+        persistent connections rather than one connection each. Waiting for
+        a free connection has no timeout, since the callers' concurrency
+        limit can exceed the pool size if the server only speaks HTTP/1.1.
+        """
+        return httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=50, keepalive_expiry=60),
+            timeout=httpx.Timeout(60.0, pool=None),
+            headers={'User-Agent': 'Balance-Sheets-Backend/1.0'}
+        )
+    
+    async def _make_request(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Make a request to the FMP API, sharing identical concurrent requests
+        
+        Callers asking for the same endpoint and params while a request is in
+        flight (or within REQUEST_CACHE_TTL of it succeeding) await the same
+        task instead of spending another API call. Failures are not cached.
+        """
+        key = _cache_key(endpoint, params)
+        task = self._requests.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(endpoint, params, key))
+            self._requests[key] = task
+            task.add_done_callback(lambda done: self._request_done(key, done))
+            if len(self._requests) > self.REQUEST_CACHE_SIZE:
+                # Dicts keep insertion order, so this drops the oldest entry
+                self._requests.pop(next(iter(self._requests)))
+        
+        # shield: one caller being cancelled must not cancel the shared request
+        return await asyncio.shield(task)
+    
+    def _request_done(self, key: str, task: asyncio.Task):
+        """Drop failed requests right away and successful ones after the TTL"""
+        if task.cancelled() or task.exception() is not None:
+            self._forget_request(key, task)
+        else:
+            asyncio.get_running_loop().call_later(
+                self.REQUEST_CACHE_TTL, self._forget_request, key, task
+            )
+    
+    def _forget_request(self, key: str, task: asyncio.Task):
+        if self._requests.get(key) is task:
+            del self._requests[key]
+    
+    async def _fetch(self, endpoint: str, params: Optional[Dict[str, Any]], key: str) -> Dict[str, Any]:
+        """Make a request to the FMP API with retry logic
+        
+        Served from the on-disk cache when it holds `key`; fresh successful
+        responses are cached for the endpoint's FMP_CACHE_TTL.
+        """
+        if self.cache is not None:
+            data = await asyncio.to_thread(self.cache.get, key)
+            if data is not None:
+                return data
+        
+        params = dict(params or {})
+        params['apikey'] = self.api_key
+        url = f"{self.base_url}/{endpoint}"
+        
+        for attempt in range(FMP_RETRY_ATTEMPTS):
+            try:
+                logger.info(f"Making request to {endpoint} (attempt {attempt + 1})")
+                response = await self.session.get(url, params=params)
+                response.raise_for_status()
+                data = orjson.loads(response.content)
+                
+                # Check for API errors
+                if isinstance(data, dict) and 'Error Message' in data:
+                    raise Exception(f"API Error: {data['Error Message']}")
+                
+                if self.cache is not None:
+                    await asyncio.to_thread(self.cache.set, key, data, expire=_cache_ttl(endpoint))
+                return data
+                
+            except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+                logger.warning(f"Request failed (attempt {attempt + 1}/{FMP_RETRY_ATTEMPTS}): {e}")
+                
+                if attempt < FMP_RETRY_ATTEMPTS - 1:
+                    wait_time = _retry_delay(attempt, getattr(e, 'response', None))
+                    logger.info(f"Waiting {wait_time:.1f} seconds before retry...")
+                    await asyncio.sleep(wait_time)
+                else:
+                    raise
+    
+    async def get_company_profile(self, ticker: str) -> Dict[str, Any]:
+        """Get company profile information"""
+        data = await self._make_request(f"profile/{ticker}")
+        return data[0] if data else {}
+    
+    async def get_balance_sheet(self, ticker: str, period: str = 'annual', limit: int = 1) -> List[Dict[str, Any]]:
+        """Get balance sheet data"""
+        return await self._make_request(
+            f"balance-sheet-statement/{ticker}",
+            params={'period': period, 'limit': limit}
+        )
+    
+    async def get_income_statement(self, ticker: str, period: str = 'annual', limit: int = 1) -> List[Dict[str, Any]]:
+        """Get income statement data"""
+        return await self._make_request(
+            f"income-statement/{ticker}",
+            params={'period': period, 'limit': limit}
+        )
+    
+    async def get_cash_flow_statement(self, ticker: str, period: str = 'annual', limit: int = 1) -> List[Dict[str, Any]]:
+        """Get cash flow statement data"""
+        return await self._make_request(
+            f"cash-flow-statement/{ticker}",
+            params={'period': period, 'limit': limit}
+        )
+    
+    async def get_quote(self, ticker: str) -> Dict[str, Any]:
+        """Get real-time quote with market cap and price"""
+        data = await self._make_request(f"quote/{ticker}")
+        return data[0] if data else {}
+    
+    async def get_key_metrics(self, ticker: str, period: str = 'annual', limit: int = 1) -> List[Dict[str, Any]]:
+        """Get key financial metrics"""
+        return await self._make_request(
+            f"key-metrics/{ticker}",
+            params={'period': period, 'limit': limit}
+        )
+    
+    async def get_sec_filings(self, ticker: str, filing_type: str = '10-K', limit: int = 5) -> List[Dict[str, Any]]:
+        """Get SEC filings list for a company"""
+        filings = await self._make_request(
+            f"v3/sec_filings/{ticker}",
+            params={'type': filing_type, 'page': 0}
+        )
+        return filings[:limit]
+    
+    async def get_financial_reports_json(self, ticker: str, year: int, period: str = 'FY') -> Dict[str, Any]:
+        """Get parsed financial report data (10-K or 10-Q)"""
+        return await self._make_request(
+            f"v4/financial-reports-json",
+            params={'symbol': ticker, 'year': year, 'period': period}
+        )
+    
+    async def get_company_profiles(self, tickers: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get profiles for several tickers in one request, keyed by symbol"""
+        data = await self._make_request(f"profile/{','.join(tickers)}")
+        return {profile['symbol']: profile for profile in data or []}
+    
+    async def get_quotes(self, tickers: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get quotes for several tickers in one request, keyed by symbol"""
+        data = await self._make_request(f"quote/{','.join(tickers)}")
+        return {quote['symbol']: quote for quote in data or []}
+    
+    @staticmethod
+    def company_data_calls(prefetched: Optional[Dict[str, Any]] = None) -> int:
+        """Number of requests fetch_company_data makes given `prefetched`"""
+        return 5 - len(prefetched or {})
+    
+    async def fetch_company_data(self, ticker: str,
+                                 prefetched: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Fetch all necessary data for a company (see FMPClient.fetch_company_data)
+        
+        The requests are independent, so they are issued concurrently.
+        `prefetched` may hold a 'profile' and/or 'quote' already fetched with
+        the multi-symbol endpoints; those requests are then skipped.
+        """
+        prefetched = prefetched or {}
+        logger.info(f"Fetching company data for {ticker}")
+        
+        calls = {}
+        if 'profile' not in prefetched:
+            calls['profile'] = self.get_company_profile(ticker)
+        calls['balance_sheet'] = self.get_balance_sheet(ticker, 'annual', 1)
+        calls['income_statement'] = self.get_income_statement(ticker, 'annual', 1)
+        if 'quote' not in prefetched:
+            calls['quote'] = self.get_quote(ticker)
+        calls['metrics'] = self.get_key_metrics(ticker, 'annual', 1)
+        
+        responses = dict(zip(calls, await asyncio.gather(*calls.values(), return_exceptions=True)))
+        
+        errors = [response for response in responses.values() if isinstance(response, Exception)]
+        result = {'api_calls_used': len(responses) - len(errors)}
+        
+        if errors:
+            logger.error(f"Error fetching data for {ticker}: {errors[0]}")
+            result['success'] = False
+            result['error'] = str(errors[0])
+            return result
+        
+        # Statement endpoints return lists; keep the latest period only
+        for key in ('balance_sheet', 'income_statement', 'metrics'):
+            responses[key] = responses[key][0] if responses[key] else {}
+        
+        result.update(prefetched)
+        result.update(responses)
+        result['success'] = True
+        
+        logger.info(f"Successfully fetched all data for {ticker} using {result['api_calls_used']} API calls")
+        return result
+    
+    async def fetch_annual_report(self, ticker: str) -> Dict[str, Any]:
+        """Fetch the latest annual report (10-K) (see FMPClient.fetch_annual_report)"""
+        api_calls = 0
+        result = {
+            'success': False,
+            'api_calls_used': 0
+        }
+        
+        try:
+            logger.info(f"Fetching 10-K filings list for {ticker}")
+            filings = await self.get_sec_filings(ticker, '10-K', 5)
+            api_calls += 1
+            
+            if not filings:
+                raise Exception("No 10-K filings found")
+            
+            target_filing = filings[0]  # Latest filing
+            result['filing_info'] = {
+                'filing_date': target_filing.get('fillingDate'),
+                'accepted_date': target_filing.get('acceptedDate'),
+                'filing_url': target_filing.get('link'),
+                'final_url': target_filing.get('finalLink')
+            }
+            
+            # Usually for previous fiscal year
+            fiscal_year = int(target_filing.get('fillingDate', '')[:4]) - 1
+            
+            logger.info(f"Fetching parsed 10-K data for {ticker} fiscal year {fiscal_year}")
+            try:
+                report_data = await self.get_financial_reports_json(ticker, fiscal_year, 'FY')
+                api_calls += 1
+                
+                if report_data:
+                    result['sections'] = report_data
+                    result['has_parsed_data'] = True
+            except Exception as e:
+                logger.warning(f"Could not fetch parsed report data: {e}")
+                result['has_parsed_data'] = False
+            
+            result['fiscal_year'] = fiscal_year
+            result['api_calls_used'] = api_calls
+            result['success'] = True
+            
+        except Exception as e:
+            logger.error(f"Error fetching 10-K for {ticker}: {e}")
+            result['error'] = str(e)
+            result['api_calls_used'] = api_calls
+        
+        return result
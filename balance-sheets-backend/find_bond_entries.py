@@ -1,11 +1,21 @@
 """Script to find and list companies that are actually bonds/notes in the database"""
 import logging
+from collections import Counter
 from database import Database
-import re
+from keyword_matcher import KeywordMatcher
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Keywords for the summary-by-pattern counts, matched case-insensitively
+SUMMARY_KEYWORDS = ['%', 'NTS', 'Notes', 'Bond', 'due', 'Senior', 'Convertible']
+SUMMARY_MATCHER = KeywordMatcher(SUMMARY_KEYWORDS)
+
+def bond_keywords_tsquery(keywords):
+    """OR the keywords into one 'simple' tsquery (multi-word keywords as phrases)"""
+    terms = {' <-> '.join(keyword.lower().split()) for keyword in keywords if keyword.strip()}
+    return ' | '.join(sorted(terms))
+
 def find_bond_entries():
     """Find companies that appear to be bonds/notes based on their names"""
     db = Database()
@@ -38,21 +48,21 @@ def find_bond_entries():
         'Series '      # Often used in bond series
     ]
     
+    # '%' is not a word, so it gets its own LIKE; every other keyword is
+    # matched as whole words against the full-text index
+    tsquery = bond_keywords_tsquery(k for k in bond_keywords if k != '%')
+    
     try:
         with db.get_connection() as conn:
             with conn.cursor() as cur:
-                # Build the WHERE clause with all keywords
-                where_conditions = []
-                params = []
-                
-                for keyword in bond_keywords:
-                    where_conditions.append("name ILIKE %s")
-                    params.append(f'%{keyword}%')
-                
-                # Also check for patterns like "Company 5.35%" or similar
-                where_clause = " OR ".join(where_conditions)
-                
-                query = f"""
+                cur.execute("""
+                    WITH hits AS (
+                        SELECT id FROM companies
+                        WHERE to_tsvector('simple', name) @@ to_tsquery('simple', %s)
+                        UNION
+                        SELECT id FROM companies
+                        WHERE name LIKE '%%\\%%%%' ESCAPE '\\'
+                    )
                     SELECT 
                         c.id,
                         c.ticker,
@@ -62,14 +72,12 @@ def find_bond_entries():
                         md.market_cap,
                         COUNT(fs.id) as snapshot_count
                     FROM companies c
+                    JOIN hits ON hits.id = c.id
                     LEFT JOIN market_data md ON c.id = md.company_id
                     LEFT JOIN financial_snapshots fs ON c.id = fs.company_id
-                    WHERE {where_clause}
                     GROUP BY c.id, c.ticker, c.name, c.sector, c.industry, md.market_cap
                     ORDER BY c.name
-                """
-                
-                cur.execute(query, params)
+                """, (tsquery,))
                 results = cur.fetchall()
                 
                 if results:
@@ -88,8 +96,12 @@ def find_bond_entries():
                     # Also show a summary by pattern
                     print("\n\nSummary by pattern:")
                     print("-"*50)
-                    for keyword in ['%', 'NTS', 'Notes', 'Bond', 'due', 'Senior', 'Convertible']:
-                        count = sum(1 for r in results if keyword.lower() in r[2].lower())
+                    # One scan per name finds every keyword it contains
+                    counts = Counter()
+                    for r in results:
+                        counts.update(set(SUMMARY_MATCHER.find_all(r[2])))
+                    for keyword in SUMMARY_KEYWORDS:
+                        count = counts[keyword]
                         if count > 0:
                             print(f"Names containing '{keyword}': {count}")
                     
@@ -129,23 +141,33 @@ def delete_bond_entries(company_ids):
     try:
         with db.get_connection() as conn:
             with conn.cursor() as cur:
-                # Delete in order due to foreign key constraints
-                # First, delete dependent data
-                cur.execute("DELETE FROM company_metrics WHERE company_id = ANY(%s)", (company_ids,))
-                deleted_metrics = cur.rowcount
-                
-                cur.execute("DELETE FROM market_data WHERE company_id = ANY(%s)", (company_ids,))
-                deleted_market = cur.rowcount
-                
-                cur.execute("DELETE FROM financial_snapshots WHERE company_id = ANY(%s)", (company_ids,))
-                deleted_snapshots = cur.rowcount
-                
-                cur.execute("DELETE FROM annual_reports WHERE company_id = ANY(%s)", (company_ids,))
-                deleted_reports = cur.rowcount
-                
-                # Finally, delete the companies
-                cur.execute("DELETE FROM companies WHERE id = ANY(%s)", (company_ids,))
-                deleted_companies = cur.rowcount
+                # Delete dependent data and the companies in one statement;
+                # foreign keys are checked at the end of it, so every part
+                # can run together
+                cur.execute("""
+                    WITH params AS (
+                        -- The ID array is sent once and shared by every DELETE
+                        SELECT %s::int[] AS ids
+                    ), d_metrics AS (
+                        DELETE FROM company_metrics WHERE company_id = ANY((SELECT ids FROM params)) RETURNING 1
+                    ), d_market AS (
+                        DELETE FROM market_data WHERE company_id = ANY((SELECT ids FROM params)) RETURNING 1
+                    ), d_snapshots AS (
+                        DELETE FROM financial_snapshots WHERE company_id = ANY((SELECT ids FROM params)) RETURNING 1
+                    ), d_reports AS (
+                        DELETE FROM annual_reports WHERE company_id = ANY((SELECT ids FROM params)) RETURNING 1
+                    ), d_companies AS (
+                        DELETE FROM companies WHERE id = ANY((SELECT ids FROM params)) RETURNING 1
+                    )
+                    SELECT
+                        (SELECT COUNT(*) FROM d_metrics),
+                        (SELECT COUNT(*) FROM d_market),
+                        (SELECT COUNT(*) FROM d_snapshots),
+                        (SELECT COUNT(*) FROM d_reports),
+                        (SELECT COUNT(*) FROM d_companies)
+                """, (company_ids,))
+                (deleted_metrics, deleted_market, deleted_snapshots,
+                 deleted_reports, deleted_companies) = cur.fetchone()
                 
                 conn.commit()
                 
@@ -1,8 +1,21 @@
 """Find and categorize non-company securities in the database"""
+import sys
+from company_cleanup import delete_companies
 from database import Database
 from collections import defaultdict
 
-def find_non_companies():
+BOND_NAME_PATTERNS = [
+    ' NT ', ' NTS ', ' NOTE', 'BOND', 'DEBENTURE',
+    ' SR ', ' JR ', 'SENIOR', 'JUNIOR', 'SUBORDINATED',
+    'DUE 20', 'FIXED RATE', 'FLOATING RATE'
+]
+
+def find_non_companies(write_script: bool = True):
+    """Categorize non-company securities and return their IDs
+    
+    Writes the full list to non_company_securities.txt and, unless
+    write_script is False, a delete_non_companies.sql script for them.
+    """
     db = Database()
     
     # Categories of non-companies
@@ -11,52 +24,52 @@ def find_non_companies():
     try:
         with db.get_connection() as conn:
             with conn.cursor() as cur:
+                # Categorize in SQL so only the matching rows come back; the
+                # CASE branches are checked in order, first match wins
                 cur.execute("""
-                    SELECT id, ticker, name, sector
-                    FROM companies
+                    SELECT id, ticker, name, category
+                    FROM (
+                        SELECT 
+                            id, ticker, name,
+                            CASE
+                                -- Warrants
+                                WHEN upper(name) LIKE '%%WARRANT%%' OR ticker_last_char = 'W'
+                                    THEN 'Warrants'
+                                -- Rights
+                                WHEN upper(name) LIKE '%%RIGHT%%' OR ticker_last_char = 'R'
+                                    THEN 'Rights'
+                                -- Units (often SPACs)
+                                WHEN upper(name) LIKE '%%UNIT%%' OR ticker_last_char = 'U'
+                                    THEN 'Units'
+                                -- Acquisition Corps (SPACs)
+                                WHEN upper(name) LIKE '%%ACQUISITION CORP%%' OR upper(name) LIKE '%%SPAC%%'
+                                    THEN 'SPACs'
+                                -- Depositary Shares/Receipts
+                                WHEN upper(name) LIKE '%%DEPOSITARY%%'
+                                    THEN 'Depositary'
+                                -- Trusts (REITs are OK, but other trusts might not be)
+                                WHEN upper(name) LIKE '%%TRUST%%'
+                                     AND upper(name) NOT LIKE '%%REIT%%'
+                                     AND upper(name) NOT LIKE '%%REAL ESTATE%%'
+                                    THEN 'Trusts'
+                                -- Preferred stocks with specific patterns
+                                WHEN (ticker LIKE '%%-P%%' OR ticker LIKE '%%.P%%') AND length(ticker) > 5
+                                    THEN 'Preferred'
+                                -- Notes/Bonds (additional patterns)
+                                WHEN upper(name) LIKE ANY (%s)
+                                    THEN 'Bonds/Notes'
+                            END AS category
+                        FROM companies
+                    ) categorized
+                    WHERE category IS NOT NULL
                     ORDER BY name
-                """)
+                """, ([f'%{pattern}%' for pattern in BOND_NAME_PATTERNS],))
                 
-                results = cur.fetchall()
+                for id, ticker, name, category in cur:
+                    categories[category].append((id, ticker, name))
                 
-                for id, ticker, name, sector in results:
-                    name_upper = name.upper()
-                    
-                    # Warrants
-                    if 'WARRANT' in name_upper or ticker.endswith('W'):
-                        categories['Warrants'].append((id, ticker, name))
-                    
-                    # Rights
-                    elif 'RIGHT' in name_upper or ticker.endswith('R'):
-                        categories['Rights'].append((id, ticker, name))
-                    
-                    # Units (often SPACs)
-                    elif 'UNIT' in name_upper or ticker.endswith('U'):
-                        categories['Units'].append((id, ticker, name))
-                    
-                    # Acquisition Corps (SPACs)
-                    elif 'ACQUISITION CORP' in name_upper or 'SPAC' in name_upper:
-                        categories['SPACs'].append((id, ticker, name))
-                    
-                    # Depositary Shares/Receipts
-                    elif 'DEPOSITARY' in name_upper or 'DEPOSITARY SHARE' in name_upper:
-                        categories['Depositary'].append((id, ticker, name))
-                    
-                    # Trusts (REITs are OK, but other trusts might not be)
-                    elif 'TRUST' in name_upper and 'REIT' not in name_upper and 'REAL ESTATE' not in name_upper:
-                        categories['Trusts'].append((id, ticker, name))
-                    
-                    # Preferred stocks with specific patterns
-                    elif any(pattern in ticker for pattern in ['-P', '.P']) and len(ticker) > 5:
-                        categories['Preferred'].append((id, ticker, name))
-                    
-                    # Notes/Bonds (additional patterns)
-                    elif any(pattern in name_upper for pattern in [
-                        ' NT ', ' NTS ', ' NOTE', 'BOND', 'DEBENTURE',
-                        ' SR ', ' JR ', 'SENIOR', 'JUNIOR', 'SUBORDINATED',
-                        'DUE 20', 'FIXED RATE', 'FLOATING RATE'
-                    ]):
-                        categories['Bonds/Notes'].append((id, ticker, name))
+                cur.execute("SELECT COUNT(*) FROM companies")
+                company_count = cur.fetchone()[0]
                 
                 # Print summary
                 print("Non-Company Securities Found:")
@@ -75,8 +88,8 @@ def find_non_companies():
                 
                 print(f"\n{'='*80}")
                 print(f"Total non-company securities found: {total}")
-                print(f"Total companies in database: {len(results)}")
-                print(f"Percentage that are non-companies: {total/len(results)*100:.1f}%")
+                print(f"Total companies in database: {company_count}")
+                print(f"Percentage that are non-companies: {total/company_count*100:.1f}%")
                 
                 # Export full list to file
                 with open('non_company_securities.txt', 'w') as f:
@@ -97,26 +110,39 @@ def find_non_companies():
                 for items in categories.values():
                     all_ids.extend([id for id, _, _ in items])
                 
-                with open('delete_non_companies.sql', 'w') as f:
-                    f.write("-- SQL to delete non-company securities\n")
-                    f.write(f"-- Total: {len(all_ids)} entries\n\n")
-                    f.write("BEGIN;\n\n")
-                    f.write("-- Delete related data first\n")
-                    f.write(f"DELETE FROM user_matches WHERE company_id IN ({','.join(map(str, all_ids))});\n")
-                    f.write(f"DELETE FROM chat_messages WHERE session_id IN (SELECT id FROM chat_sessions WHERE company_id IN ({','.join(map(str, all_ids))}));\n")
-                    f.write(f"DELETE FROM chat_sessions WHERE company_id IN ({','.join(map(str, all_ids))});\n")
-                    f.write(f"DELETE FROM company_metrics WHERE company_id IN ({','.join(map(str, all_ids))});\n")
-                    f.write(f"DELETE FROM market_data WHERE company_id IN ({','.join(map(str, all_ids))});\n")
-                    f.write(f"DELETE FROM financial_snapshots WHERE company_id IN ({','.join(map(str, all_ids))});\n")
-                    f.write(f"DELETE FROM data_fetch_log WHERE ticker IN (SELECT ticker FROM companies WHERE id IN ({','.join(map(str, all_ids))}));\n")
-                    f.write(f"\n-- Delete companies\n")
-                    f.write(f"DELETE FROM companies WHERE id IN ({','.join(map(str, all_ids))});\n")
-                    f.write("\nCOMMIT;\n")
+                if write_script:
+                    with open('delete_non_companies.sql', 'w') as f:
+                        f.write("-- SQL to delete non-company securities\n")
+                        f.write(f"-- Total: {len(all_ids)} entries\n\n")
+                        f.write("BEGIN;\n\n")
+                        # The ID list is written once, as an array literal, into a
+                        # temp table that every DELETE below joins against
+                        f.write("CREATE TEMP TABLE _todo (id INTEGER PRIMARY KEY) ON COMMIT DROP;\n")
+                        f.write(f"INSERT INTO _todo SELECT unnest('{{{','.join(map(str, all_ids))}}}'::int[]);\n")
+                        f.write("ANALYZE _todo;\n\n")
+                        f.write("-- Delete related data first\n")
+                        f.write("DELETE FROM user_matches WHERE company_id IN (SELECT id FROM _todo);\n")
+                        f.write("DELETE FROM chat_messages WHERE session_id IN (SELECT cs.id FROM chat_sessions cs JOIN _todo t ON cs.company_id = t.id);\n")
+                        f.write("DELETE FROM chat_sessions WHERE company_id IN (SELECT id FROM _todo);\n")
+                        f.write("DELETE FROM company_metrics WHERE company_id IN (SELECT id FROM _todo);\n")
+                        f.write("DELETE FROM market_data WHERE company_id IN (SELECT id FROM _todo);\n")
+                        f.write("DELETE FROM financial_snapshots WHERE company_id IN (SELECT id FROM _todo);\n")
+                        f.write("DELETE FROM data_fetch_log WHERE ticker IN (SELECT c.ticker FROM companies c JOIN _todo t ON c.id = t.id);\n")
+                        f.write(f"\n-- Delete companies\n")
+                        f.write("DELETE FROM companies WHERE id IN (SELECT id FROM _todo);\n")
+                        f.write("\nCOMMIT;\n")
+                    
+                    print(f"SQL delete script created: delete_non_companies.sql")
                 
-                print(f"SQL delete script created: delete_non_companies.sql")
+                return all_ids
                 
     except Exception as e:
         print(f"Error: {e}")
+        return []
 
 if __name__ == "__main__":
-    find_non_companies()
\ No newline at end of file
+    # --delete removes the securities directly instead of writing the SQL script
+    delete = len(sys.argv) > 1 and sys.argv[1] == '--delete'
+    company_ids = find_non_companies(write_script=not delete)
+    if delete and company_ids:
+        print(f"\nDeleted {delete_companies(company_ids)} non-company securities")
\ No newline at end of file
@@ -13,92 +13,75 @@ def find_definite_bond_entries():
     try:
         with db.get_connection() as conn:
             with conn.cursor() as cur:
-                # Query for entries with percentage signs in name
-                print("\n=== Companies with percentage signs in name ===")
+                # One pass over companies: flag each name against the three
+                # pattern groups and join the details for the matches
+                # (\y is the PostgreSQL regex word boundary; \b matches a
+                # backspace)
                 cur.execute("""
-                    SELECT c.id, c.ticker, c.name, c.sector
-                    FROM companies c
-                    WHERE c.name LIKE '%\\%%' ESCAPE '\\'
-                    ORDER BY c.name
-                """)
-                
-                percent_results = cur.fetchall()
-                if percent_results:
-                    print(f"\nFound {len(percent_results)} companies with % in name:")
-                    print("-"*100)
-                    for id, ticker, name, sector in percent_results:
-                        print(f"ID: {id:<6} Ticker: {ticker:<15} Name: {name}")
-                
-                # Query for entries with "Notes" or "Bonds" in name
-                print("\n\n=== Companies with 'Notes' or 'Bonds' in name ===")
-                cur.execute("""
-                    SELECT c.id, c.ticker, c.name, c.sector
-                    FROM companies c
-                    WHERE c.name ~* '\\b(notes?|bonds?|debentures?)\\b'
-                       OR c.name ~* '\\bdue\\s+\\d{4}\\b'
-                       OR c.name ~* '\\b(senior|subordinated|convertible)\\s+(notes?|bonds?)\\b'
+                    WITH flagged AS (
+                        SELECT 
+                            c.id,
+                            c.name LIKE '%\\%%' ESCAPE '\\' AS has_percent,
+                            (c.name ~* '\\y(notes?|bonds?|debentures?)\\y'
+                             OR c.name ~* '\\ydue\\s+\\d{4}\\y'
+                             OR c.name ~* '\\y(senior|subordinated|convertible)\\s+(notes?|bonds?)\\y') AS has_keyword,
+                            (c.name ~ '\\d+\\.\\d+%'  -- Pattern like "5.35%"
+                             OR c.name ~ '\\d{1,2}/\\d{1,2}/\\d{2,4}'  -- Date patterns
+                             OR c.name ~ '\\y\\d{4}\\s+(Senior|Subordinated|Notes|Bonds)') AS has_numeric  -- Year patterns
+                        FROM companies c
+                    ),
+                    hits AS (
+                        SELECT * FROM flagged
+                        WHERE has_percent OR has_keyword OR has_numeric
+                    )
+                    SELECT 
+                        c.id,
+                        c.ticker,
+                        c.name,
+                        c.sector,
+                        COUNT(fs.id) as snapshot_count,
+                        md.market_cap,
+                        hits.has_percent,
+                        hits.has_keyword,
+                        hits.has_numeric
+                    FROM hits
+                    JOIN companies c ON c.id = hits.id
+                    LEFT JOIN financial_snapshots fs ON c.id = fs.company_id
+                    LEFT JOIN market_data md ON c.id = md.company_id
+                    GROUP BY c.id, c.ticker, c.name, c.sector, md.market_cap,
+                             hits.has_percent, hits.has_keyword, hits.has_numeric
                     ORDER BY c.name
                 """)
                 
-                bond_results = cur.fetchall()
-                if bond_results:
-                    print(f"\nFound {len(bond_results)} companies with bond/note keywords:")
-                    print("-"*100)
-                    for id, ticker, name, sector in bond_results:
-                        print(f"ID: {id:<6} Ticker: {ticker:<15} Name: {name}")
-                
-                # Query for entries with numeric patterns typical of bonds
-                print("\n\n=== Companies with bond-like numeric patterns ===")
-                cur.execute("""
-                    SELECT c.id, c.ticker, c.name, c.sector
-                    FROM companies c
-                    WHERE c.name ~ '\\d+\\.\\d+%'  -- Pattern like "5.35%"
-                       OR c.name ~ '\\d{1,2}/\\d{1,2}/\\d{2,4}'  -- Date patterns
-                       OR c.name ~ '\\b\\d{4}\\s+(Senior|Subordinated|Notes|Bonds)'  -- Year patterns
-                    ORDER BY c.name
-                """)
+                detailed_results = cur.fetchall()
                 
-                numeric_results = cur.fetchall()
-                if numeric_results:
-                    print(f"\nFound {len(numeric_results)} companies with bond-like numeric patterns:")
-                    print("-"*100)
-                    for id, ticker, name, sector in numeric_results:
-                        print(f"ID: {id:<6} Ticker: {ticker:<15} Name: {name}")
+                sections = [
+                    ("Companies with percentage signs in name", "with % in name", 6),
+                    ("Companies with 'Notes' or 'Bonds' in name", "with bond/note keywords", 7),
+                    ("Companies with bond-like numeric patterns", "with bond-like numeric patterns", 8),
+                ]
+                for i, (title, description, flag) in enumerate(sections):
+                    print(("\n\n" if i else "\n") + f"=== {title} ===")
+                    matches = [r for r in detailed_results if r[flag]]
+                    if matches:
+                        print(f"\nFound {len(matches)} companies {description}:")
+                        print("-"*100)
+                        for id, ticker, name, *_ in matches:
+                            print(f"ID: {id:<6} Ticker: {ticker:<15} Name: {name}")
                 
-                # Combine all results and remove duplicates
-                all_bond_ids = set()
-                all_bond_ids.update([r[0] for r in percent_results])
-                all_bond_ids.update([r[0] for r in bond_results])
-                all_bond_ids.update([r[0] for r in numeric_results])
+                all_bond_ids = {r[0] for r in detailed_results}
                 
                 print(f"\n\n=== SUMMARY ===")
                 print(f"Total unique bond/note entries found: {len(all_bond_ids)}")
                 print(f"Company IDs: {sorted(list(all_bond_ids))}")
                 
-                # Get more details about these companies
-                if all_bond_ids:
+                # More details about these companies
+                if detailed_results:
                     print("\n\n=== Detailed information for bond entries ===")
-                    cur.execute("""
-                        SELECT 
-                            c.id,
-                            c.ticker,
-                            c.name,
-                            c.sector,
-                            COUNT(fs.id) as snapshot_count,
-                            md.market_cap
-                        FROM companies c
-                        LEFT JOIN financial_snapshots fs ON c.id = fs.company_id
-                        LEFT JOIN market_data md ON c.id = md.company_id
-                        WHERE c.id = ANY(%s)
-                        GROUP BY c.id, c.ticker, c.name, c.sector, md.market_cap
-                        ORDER BY c.name
-                    """, (list(all_bond_ids),))
-                    
-                    detailed_results = cur.fetchall()
                     print("-"*120)
                     print(f"{'ID':<6} {'Ticker':<15} {'Name':<60} {'Snapshots':<10} {'Market Cap':<15}")
                     print("-"*120)
-                    for id, ticker, name, sector, snapshot_count, market_cap in detailed_results:
+                    for id, ticker, name, sector, snapshot_count, market_cap, *_ in detailed_results:
                         market_cap_str = f"${market_cap:,.0f}" if market_cap else "N/A"
                         print(f"{id:<6} {ticker:<15} {name[:60]:<60} {snapshot_count:<10} {market_cap_str:<15}")
                 
@@ -125,31 +108,53 @@ def delete_bond_entries(company_ids):
                 for id, ticker, name in companies_to_delete:
                     print(f"ID: {id}, Ticker: {ticker}, Name: {name}")
                 
-                # Delete in order due to foreign key constraints
+                # Delete dependent data and the companies in one statement.
+                # All parts share one snapshot, so the data_fetch_log subquery
+                # still sees the companies being deleted alongside it, and
+                # foreign keys are only checked once the whole statement is done.
                 tables_to_clean = [
-                    ('user_matches', 'company_id'),
-                    ('chat_sessions', 'company_id'),
-                    ('company_metrics', 'company_id'),
-                    ('market_data', 'company_id'),
-                    ('financial_snapshots', 'company_id'),
-                    ('annual_reports', 'company_id'),
-                    ('data_fetch_log', 'ticker IN (SELECT ticker FROM companies WHERE id = ANY(%s))'),
+                    'user_matches', 'chat_sessions', 'company_metrics',
+                    'market_data', 'financial_snapshots', 'annual_reports',
                 ]
-                
-                for table, condition in tables_to_clean[:-1]:
-                    cur.execute(f"DELETE FROM {table} WHERE {condition} = ANY(%s)", (company_ids,))
-                    print(f"Deleted {cur.rowcount} rows from {table}")
-                
-                # Special handling for data_fetch_log (uses ticker)
                 cur.execute("""
-                    DELETE FROM data_fetch_log 
-                    WHERE ticker IN (SELECT ticker FROM companies WHERE id = ANY(%s))
+                    WITH params AS (
+                        -- The ID array is sent once and shared by every DELETE
+                        SELECT %s::int[] AS ids
+                    ), d_user_matches AS (
+                        DELETE FROM user_matches WHERE company_id = ANY((SELECT ids FROM params)) RETURNING 1
+                    ), d_chat_sessions AS (
+                        DELETE FROM chat_sessions WHERE company_id = ANY((SELECT ids FROM params)) RETURNING 1
+                    ), d_company_metrics AS (
+                        DELETE FROM company_metrics WHERE company_id = ANY((SELECT ids FROM params)) RETURNING 1
+                    ), d_market_data AS (
+                        DELETE FROM market_data WHERE company_id = ANY((SELECT ids FROM params)) RETURNING 1
+                    ), d_financial_snapshots AS (
+                        DELETE FROM financial_snapshots WHERE company_id = ANY((SELECT ids FROM params)) RETURNING 1
+                    ), d_annual_reports AS (
+                        DELETE FROM annual_reports WHERE company_id = ANY((SELECT ids FROM params)) RETURNING 1
+                    ), d_data_fetch_log AS (
+                        -- data_fetch_log is keyed by ticker
+                        DELETE FROM data_fetch_log 
+                        WHERE ticker IN (SELECT ticker FROM companies WHERE id = ANY((SELECT ids FROM params)))
+                        RETURNING 1
+                    ), d_companies AS (
+                        DELETE FROM companies WHERE id = ANY((SELECT ids FROM params)) RETURNING 1
+                    )
+                    SELECT
+                        (SELECT COUNT(*) FROM d_user_matches),
+                        (SELECT COUNT(*) FROM d_chat_sessions),
+                        (SELECT COUNT(*) FROM d_company_metrics),
+                        (SELECT COUNT(*) FROM d_market_data),
+                        (SELECT COUNT(*) FROM d_financial_snapshots),
+                        (SELECT COUNT(*) FROM d_annual_reports),
+                        (SELECT COUNT(*) FROM d_data_fetch_log),
+                        (SELECT COUNT(*) FROM d_companies)
                 """, (company_ids,))
-                print(f"Deleted {cur.rowcount} rows from data_fetch_log")
+                *table_counts, deleted_fetch_log, deleted_companies = cur.fetchone()
                 
-                # Finally, delete the companies
-                cur.execute("DELETE FROM companies WHERE id = ANY(%s)", (company_ids,))
-                deleted_companies = cur.rowcount
+                for table, deleted in zip(tables_to_clean, table_counts):
+                    print(f"Deleted {deleted} rows from {table}")
+                print(f"Deleted {deleted_fetch_log} rows from data_fetch_log")
                 
                 conn.commit()
                 
@@ -0,0 +1,29 @@
+"""Shared text formatting for financial data listings"""
+from operator import itemgetter
+
+# Column layout for financial snapshot listings
+FINANCIAL_ROW_TEMPLATE = '{:<12} {:<6} {:<15} {:<15} {:<15} {:<15}'.format
+FINANCIAL_HEADER = FINANCIAL_ROW_TEMPLATE(
+    'Date', 'Type', 'Revenue', 'Net Income', 'Op Cash Flow', 'Free Cash Flow'
+)
+
+# (period_end_date, report_type, revenue, net_income, operating_cash_flow, free_cash_flow)
+_financial_columns = itemgetter(0, 1, 2, 3, 4, 5)
+
+
+def format_billions(value) -> str:
+    """Format a dollar amount in billions, or N/A if missing/zero"""
+    return f"${float(value) / 1e9:.1f}B" if value else "N/A"
+
+
+def format_financial_row(row) -> str:
+    """Format a financial snapshot row for a table listing
+
+    Expects the row to start with period_end_date, report_type, revenue,
+    net_income, operating_cash_flow and free_cash_flow; extra columns are
+    ignored.
+    """
+    date, report_type, *amounts = _financial_columns(row)
+    return FINANCIAL_ROW_TEMPLATE(
+        date.strftime('%Y-%m-%d'), report_type, *map(format_billions, amounts)
+    )
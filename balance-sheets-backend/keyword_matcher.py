@@ -0,0 +1,28 @@
+"""Multi-keyword substring matching with an Aho-Corasick automaton"""
+from typing import Iterable, List
+
+import ahocorasick
+
+
+class KeywordMatcher:
+    """Check whether text contains any of a set of keywords
+
+    All keywords are matched in a single linear pass over the text, instead
+    of one substring scan per keyword. Matching ignores case unless
+    `case_sensitive` is set.
+    """
+
+    def __init__(self, keywords: Iterable[str], case_sensitive: bool = False):
+        self._normalize = str if case_sensitive else str.upper
+        self.automaton = ahocorasick.Automaton()
+        for keyword in keywords:
+            self.automaton.add_word(self._normalize(keyword), keyword)
+        self.automaton.make_automaton()
+
+    def search(self, text: str) -> bool:
+        """Return True if text contains any keyword"""
+        return next(self.automaton.iter(self._normalize(text)), None) is not None
+
+    def find_all(self, text: str) -> List[str]:
+        """Return every keyword occurrence in text (original spelling, in order)"""
+        return [keyword for _, keyword in self.automaton.iter(self._normalize(text))]
@@ -16,9 +16,13 @@ class Company:
     logo_url: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class FinancialSnapshot:
-    """Financial statement data for a specific period"""
+    """Financial statement data for a specific period
+    
+    Slotted: bulk historical loads hold thousands of these at once, and
+    slots drop the per-instance __dict__.
+    """
     id: Optional[int] = None
     company_id: int = 0
     period_end_date: datetime = None
@@ -60,11 +64,11 @@ class CompanyMetrics:
     snapshot_id: int
     
     # Financial Ratios
-    p_e_ratio: Optional[Decimal] = None
-    p_b_ratio: Optional[Decimal] = None
-    debt_to_equity: Optional[Decimal] = None
-    current_ratio: Optional[Decimal] = None
-    roe: Optional[Decimal] = None  # Return on Equity
+    p_e_ratio: Optional[float] = None
+    p_b_ratio: Optional[float] = None
+    debt_to_equity: Optional[float] = None
+    current_ratio: Optional[float] = None
+    roe: Optional[float] = None  # Return on Equity
     
     # Game-specific
     difficulty_score: int = 5  # 1-10
@@ -141,6 +145,9 @@ class AnnualReport:
 
 # SQL Table Creation Statements
 SQL_CREATE_TABLES = """
+-- Extensions
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Companies table
 CREATE TABLE IF NOT EXISTS companies (
     id SERIAL PRIMARY KEY,
@@ -149,6 +156,8 @@ CREATE TABLE IF NOT EXISTS companies (
     sector VARCHAR(100),
     industry VARCHAR(100),
     logo_url TEXT,
+    -- Suffix that marks warrants (W), rights (R) and units (U)
+    ticker_last_char CHAR(1) GENERATED ALWAYS AS (right(ticker, 1)) STORED,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -176,7 +185,8 @@ CREATE TABLE IF NOT EXISTS financial_snapshots (
     
     -- Other
     shares_outstanding NUMERIC(20, 2),
-    raw_data JSONB,
+    raw_data JSONB,  -- legacy uncompressed responses
+    raw_data_zst BYTEA,  -- zstd-compressed JSON API response
     
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(company_id, period_end_date, report_type)
@@ -222,6 +232,12 @@ CREATE TABLE IF NOT EXISTS data_fetch_log (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Daily API call counter, reserved atomically by Database.reserve_api_calls
+CREATE TABLE IF NOT EXISTS api_rate_counter (
+    day DATE PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0
+);
+
 -- User matches table
 CREATE TABLE IF NOT EXISTS user_matches (
     id SERIAL PRIMARY KEY,
@@ -278,8 +294,16 @@ CREATE TABLE IF NOT EXISTS annual_reports (
     UNIQUE(company_id, fiscal_year)
 );
 
+-- Columns added after the tables were first created; no-ops on new databases
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS ticker_last_char CHAR(1) GENERATED ALWAYS AS (right(ticker, 1)) STORED;
+
 -- Create indexes
 CREATE INDEX IF NOT EXISTS idx_companies_ticker ON companies(ticker);
+CREATE INDEX IF NOT EXISTS idx_companies_ticker_last_char ON companies(ticker_last_char);
+-- Trigram index so LIKE '%...%' and ~* scans on company names can use an index
+CREATE INDEX IF NOT EXISTS idx_companies_name_trgm ON companies USING gin (name gin_trgm_ops);
+-- Full-text index for whole-word keyword searches on company names
+CREATE INDEX IF NOT EXISTS idx_companies_name_fts ON companies USING gin (to_tsvector('simple', name));
 CREATE INDEX IF NOT EXISTS idx_financial_snapshots_company_date ON financial_snapshots(company_id, period_end_date);
 CREATE INDEX IF NOT EXISTS idx_market_data_last_updated ON market_data(last_updated);
 CREATE INDEX IF NOT EXISTS idx_data_fetch_log_timestamp ON data_fetch_log(fetch_timestamp);
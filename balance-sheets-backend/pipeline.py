@@ -18,6 +18,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# API calls process_company reserves: 5 for company data, 2 for the annual report
+PROCESS_COMPANY_CALLS = 7
+
 
 class DataPipeline:
     """Main ETL pipeline for financial data"""
@@ -25,41 +28,83 @@ class DataPipeline:
     def __init__(self):
         self.db = Database()
         self.api_client = FMPClient()
+        # ticker -> ID of companies this pipeline has stored or looked up
+        self._company_ids: Dict[str, int] = {}
     
-    def check_rate_limit(self) -> bool:
-        """Check if we're within API rate limits"""
-        calls_today = self.db.get_api_calls_today()
+    def check_rate_limit(self, calls_needed: int = 1) -> bool:
+        """Reserve `calls_needed` API calls if that stays within the daily limit
+        
+        The reservation is one atomic counter update, so concurrent workers
+        can't overshoot the limit between checking and calling.
+        """
+        calls_today = self.db.reserve_api_calls(calls_needed, FMP_RATE_LIMIT_PER_DAY)
         
-        if calls_today >= FMP_RATE_LIMIT_PER_DAY:
-            logger.warning(f"Rate limit reached: {calls_today}/{FMP_RATE_LIMIT_PER_DAY} calls today")
+        if calls_today is None:
+            logger.warning(f"Rate limit reached: no room for {calls_needed} more calls today "
+                           f"(limit {FMP_RATE_LIMIT_PER_DAY})")
             return False
         
         logger.info(f"API calls today: {calls_today}/{FMP_RATE_LIMIT_PER_DAY}")
         return True
     
-    def process_company(self, ticker: str) -> bool:
+    def process_company(self, ticker: str, calls_reserved: bool = False) -> bool:
         """Process a single company - fetch data, calculate metrics, and store
         
+        Pass calls_reserved=True if the caller already reserved
+        PROCESS_COMPANY_CALLS calls with check_rate_limit.
+        
         Returns True if successful, False otherwise
         """
         logger.info(f"Starting to process {ticker}")
         
-        # Check rate limit
-        if not self.check_rate_limit():
+        # Check rate limit; calls that aren't made are released at the end
+        reserved_calls = PROCESS_COMPANY_CALLS
+        if not calls_reserved and not self.check_rate_limit(reserved_calls):
             logger.error("Rate limit exceeded, cannot process company")
             return False
         
+        calls_used = 0
+        try:
+            fetch_timestamp = datetime.now()
+            
+            # Fetch all data from API
+            logger.info(f"Fetching data from Financial Modeling Prep API for {ticker}")
+            raw_data = self.api_client.fetch_company_data(ticker)
+            calls_used += raw_data.get('api_calls_used', 0)
+            
+            company_id = self.process_company_data(ticker, raw_data, fetch_timestamp)
+            if company_id is None:
+                return False
+            
+            # Try to fetch annual report (optional, don't fail if it doesn't work)
+            try:
+                logger.info(f"Fetching annual report for {ticker} (year: latest)")
+                report_data = self.api_client.fetch_annual_report(ticker)
+                calls_used += report_data.get('api_calls_used', 0)
+                self.store_annual_report(ticker, company_id, report_data)
+            except Exception as e:
+                logger.warning(f"Could not fetch annual report for {ticker}: {e}")
+            
+            return True
+            
+        finally:
+            if calls_used < reserved_calls:
+                self.db.release_api_calls(reserved_calls - calls_used)
+    
+    def process_company_data(self, ticker: str, raw_data: Dict[str, Any],
+                             fetch_timestamp: Optional[datetime] = None) -> Optional[int]:
+        """Calculate metrics for already-fetched company data and store it
+        
+        `raw_data` is the result of FMPClient.fetch_company_data (or its
+        async counterpart). Returns the company ID, or None on failure.
+        """
         # Initialize fetch log
         fetch_log = DataFetchLog(
             ticker=ticker,
-            fetch_timestamp=datetime.now()
+            fetch_timestamp=fetch_timestamp or datetime.now()
         )
         
         try:
-            # Fetch all data from API
-            logger.info(f"Fetching data from Financial Modeling Prep API for {ticker}")
-            raw_data = self.api_client.fetch_company_data(ticker)
-            
             fetch_log.api_calls_used = raw_data.get('api_calls_used', 0)
             
             if not raw_data.get('success', False):
@@ -68,101 +113,98 @@ class DataPipeline:
             # Parse the data
             parsed_data = FMPClient.parse_financial_data(raw_data)
             
-            # Store company information
-            company_data = parsed_data.get('company', {})
-            company = Company(
-                ticker=company_data.get('ticker'),
-                name=company_data.get('name'),
-                sector=company_data.get('sector'),
-                industry=company_data.get('industry'),
-                logo_url=company_data.get('logo_url')
-            )
-            
-            logger.info(f"Inserting company: {company.name}")
-            company_id = self.db.insert_company(company)
-            
-            # Store financial snapshot
-            bs_data = parsed_data.get('balance_sheet', {})
-            income_data = parsed_data.get('income_statement', {})
-            market_data = parsed_data.get('market_data', {})
-            
-            snapshot = FinancialSnapshot(
-                company_id=company_id,
-                period_end_date=datetime.strptime(bs_data.get('period_end_date'), '%Y-%m-%d'),
-                report_type=bs_data.get('report_type', '10-K'),
-                assets=bs_data.get('assets'),
-                liabilities=bs_data.get('liabilities'),
-                equity=bs_data.get('equity'),
-                cash=bs_data.get('cash'),
-                debt=bs_data.get('debt'),
-                revenue=income_data.get('revenue'),
-                net_income=income_data.get('net_income'),
-                shares_outstanding=market_data.get('shares_outstanding'),
-                raw_data=raw_data  # Store complete API response
-            )
-            
-            logger.info(f"Inserting financial snapshot for period ending {snapshot.period_end_date}")
-            snapshot_id = self.db.insert_financial_snapshot(snapshot)
-            
-            # Update market data
-            market = MarketData(
-                company_id=company_id,
-                market_cap=market_data.get('market_cap'),
-                stock_price=market_data.get('stock_price'),
-                last_updated=datetime.now()
-            )
-            
-            logger.info(f"Updating market data - Market Cap: ${market.market_cap:,.0f}")
-            self.db.update_market_data(market)
-            
-            # Calculate financial metrics
-            logger.info("Calculating financial metrics")
-            metrics_data = FinancialCalculator.calculate_all_metrics(
-                stock_price=market.stock_price,
-                market_cap=market.market_cap,
-                net_income=snapshot.net_income,
-                shares_outstanding=snapshot.shares_outstanding,
-                assets=snapshot.assets,
-                liabilities=snapshot.liabilities,
-                equity=snapshot.equity,
-                debt=snapshot.debt
-            )
-            
-            # Store metrics
-            metrics = CompanyMetrics(
-                company_id=company_id,
-                snapshot_id=snapshot_id,
-                p_e_ratio=metrics_data.get('p_e_ratio'),
-                p_b_ratio=metrics_data.get('p_b_ratio'),
-                debt_to_equity=metrics_data.get('debt_to_equity'),
-                current_ratio=metrics_data.get('current_ratio'),
-                roe=metrics_data.get('roe'),
-                difficulty_score=metrics_data.get('difficulty_score')
-            )
-            
-            logger.info(f"Storing calculated metrics - P/E: {metrics.p_e_ratio}, P/B: {metrics.p_b_ratio}")
-            self.db.insert_company_metrics(metrics)
+            # Store everything for this company in one transaction (one commit)
+            with self.db.transaction() as conn:
+                # Store company information
+                company_data = parsed_data.get('company', {})
+                company = Company(
+                    ticker=company_data.get('ticker'),
+                    name=company_data.get('name'),
+                    sector=company_data.get('sector'),
+                    industry=company_data.get('industry'),
+                    logo_url=company_data.get('logo_url')
+                )
+                
+                logger.info(f"Inserting company: {company.name}")
+                company_id = self.db.insert_company(company, conn=conn)
+                
+                # Store financial snapshot
+                bs_data = parsed_data.get('balance_sheet', {})
+                income_data = parsed_data.get('income_statement', {})
+                market_data = parsed_data.get('market_data', {})
+                
+                snapshot = FinancialSnapshot(
+                    company_id=company_id,
+                    period_end_date=datetime.fromisoformat(bs_data.get('period_end_date')),
+                    report_type=bs_data.get('report_type', '10-K'),
+                    assets=bs_data.get('assets'),
+                    liabilities=bs_data.get('liabilities'),
+                    equity=bs_data.get('equity'),
+                    cash=bs_data.get('cash'),
+                    debt=bs_data.get('debt'),
+                    revenue=income_data.get('revenue'),
+                    net_income=income_data.get('net_income'),
+                    shares_outstanding=market_data.get('shares_outstanding'),
+                    raw_data=raw_data  # Store complete API response
+                )
+                
+                logger.info(f"Inserting financial snapshot for period ending {snapshot.period_end_date}")
+                snapshot_id = self.db.insert_financial_snapshot(snapshot, conn=conn)
+                
+                # Update market data
+                market = MarketData(
+                    company_id=company_id,
+                    market_cap=market_data.get('market_cap'),
+                    stock_price=market_data.get('stock_price'),
+                    last_updated=datetime.now()
+                )
+                
+                logger.info(f"Updating market data - Market Cap: ${market.market_cap:,.0f}")
+                self.db.update_market_data(market, conn=conn)
+                
+                # Calculate financial metrics
+                logger.info("Calculating financial metrics")
+                metrics_data = FinancialCalculator.calculate_all_metrics(
+                    stock_price=market.stock_price,
+                    market_cap=market.market_cap,
+                    net_income=snapshot.net_income,
+                    shares_outstanding=snapshot.shares_outstanding,
+                    assets=snapshot.assets,
+                    liabilities=snapshot.liabilities,
+                    equity=snapshot.equity,
+                    debt=snapshot.debt
+                )
+                
+                # Store metrics
+                metrics = CompanyMetrics(
+                    company_id=company_id,
+                    snapshot_id=snapshot_id,
+                    p_e_ratio=metrics_data.get('p_e_ratio'),
+                    p_b_ratio=metrics_data.get('p_b_ratio'),
+                    debt_to_equity=metrics_data.get('debt_to_equity'),
+                    current_ratio=metrics_data.get('current_ratio'),
+                    roe=metrics_data.get('roe'),
+                    difficulty_score=metrics_data.get('difficulty_score')
+                )
+                
+                logger.info(f"Storing calculated metrics - P/E: {metrics.p_e_ratio}, P/B: {metrics.p_b_ratio}")
+                self.db.insert_company_metrics(metrics, conn=conn)
             
             # Success!
             fetch_log.success = True
+            self._company_ids[ticker] = company_id
             logger.info(f"Successfully processed {ticker}")
             
             # Print summary
             self._print_summary(ticker, company, snapshot, market, metrics)
             
-            # Try to fetch annual report (optional, don't fail if it doesn't work)
-            try:
-                self.fetch_and_store_annual_report(ticker, company_id)
-            except Exception as e:
-                logger.warning(f"Could not fetch annual report for {ticker}: {e}")
-            
-            return True
+            return company_id
             
         except Exception as e:
             logger.error(f"Error processing {ticker}: {e}")
             fetch_log.success = False
             fetch_log.error_message = str(e)
-            return False
+            return None
             
         finally:
             # Always log the fetch attempt
@@ -187,10 +229,10 @@ class DataPipeline:
         print(f"  Market Cap: ${market.market_cap:,.0f}")
         print(f"  Stock Price: ${market.stock_price:.2f}")
         print(f"\nCalculated Metrics:")
-        print(f"  P/E Ratio: {metrics.p_e_ratio or 'N/A'}")
-        print(f"  P/B Ratio: {metrics.p_b_ratio or 'N/A'}")
-        print(f"  Debt/Equity: {metrics.debt_to_equity or 'N/A'}")
-        print(f"  ROE: {metrics.roe or 'N/A'}%")
+        print(f"  P/E Ratio: {metrics.p_e_ratio if metrics.p_e_ratio is not None else 'N/A'}")
+        print(f"  P/B Ratio: {metrics.p_b_ratio if metrics.p_b_ratio is not None else 'N/A'}")
+        print(f"  Debt/Equity: {metrics.debt_to_equity if metrics.debt_to_equity is not None else 'N/A'}")
+        print(f"  ROE: {metrics.roe if metrics.roe is not None else 'N/A'}%")
         print(f"  Difficulty Score: {metrics.difficulty_score}/10")
         print(f"{'='*50}\n")
     
@@ -204,8 +246,8 @@ class DataPipeline:
             logger.error(f"Company {ticker} not found in database")
             return False
         
-        # Check rate limit
-        if not self.check_rate_limit():
+        # Check rate limit (one quote call)
+        if not self.check_rate_limit(1):
             return False
         
         fetch_log = DataFetchLog(
@@ -260,7 +302,19 @@ class DataPipeline:
         try:
             # Fetch 10-K data from FMP
             report_data = self.api_client.fetch_annual_report(ticker, year)
-            
+        except Exception as e:
+            logger.error(f"Error fetching annual report for {ticker}: {e}")
+            return False
+        
+        return self.store_annual_report(ticker, company_id, report_data)
+    
+    def store_annual_report(self, ticker: str, company_id: int, report_data: Dict[str, Any]) -> bool:
+        """Store an already-fetched annual report (result of fetch_annual_report)
+        
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
             if not report_data.get('success'):
                 logger.error(f"Failed to fetch annual report: {report_data.get('error')}")
                 return False
@@ -274,7 +328,7 @@ class DataPipeline:
             filing_date = None
             if filing_date_str := filing_info.get('filing_date'):
                 try:
-                    filing_date = datetime.strptime(filing_date_str[:10], '%Y-%m-%d')
+                    filing_date = datetime.fromisoformat(filing_date_str[:10])
                 except:
                     pass
             
@@ -0,0 +1,76 @@
+"""Token-bucket rate limiting for FMP API calls"""
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket
+    
+    Tokens refill continuously at `rate_per_minute / 60` per second, up to
+    `capacity`. Callers take one token per API call, so calls are spaced
+    evenly instead of bursting and then idling out the rest of the minute.
+    In any 60 second window at most `capacity + rate_per_minute` calls go
+    out, so keep that sum under the provider limit.
+    """
+    
+    def __init__(self, rate_per_minute: float, capacity: int):
+        self.capacity = capacity
+        self.refill_rate = rate_per_minute / 60.0
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self):
+        """Add the tokens earned since the last refill (caller holds the lock)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+    
+    def try_acquire(self, tokens: int = 1) -> bool:
+        """Take `tokens` if they are available right now"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+    
+    def acquire(self, tokens: int = 1) -> float:
+        """Block until `tokens` are available and take them
+        
+        Returns the number of seconds spent waiting.
+        """
+        if tokens > self.capacity:
+            raise ValueError(f"Cannot acquire {tokens} tokens from a bucket of {self.capacity}")
+        
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                # Sleep exactly until enough tokens have accrued
+                wait_time = (tokens - self.tokens) / self.refill_rate
+            time.sleep(wait_time)
+            waited += wait_time
+    
+    async def wait(self, tokens: int = 1) -> float:
+        """Awaitable acquire() for use on an event loop
+        
+        Returns the number of seconds spent waiting.
+        """
+        if tokens > self.capacity:
+            raise ValueError(f"Cannot acquire {tokens} tokens from a bucket of {self.capacity}")
+        
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait_time = (tokens - self.tokens) / self.refill_rate
+            await asyncio.sleep(wait_time)
+            waited += wait_time
@@ -1,12 +1,20 @@
 """Remove all non-company securities from the database"""
 import logging
 from database import Database
-from find_non_companies import find_non_companies
+from find_non_companies import find_non_companies, BOND_NAME_PATTERNS
 from collections import defaultdict
+from keyword_matcher import KeywordMatcher
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Every name keyword the categories below test for, matched in one pass
+NAME_MATCHER = KeywordMatcher([
+    'WARRANT', 'RIGHT', 'UNIT', 'ACQUISITION CORP', 'SPAC', 'DEPOSITARY',
+    'TRUST', 'REIT', 'REAL ESTATE', *BOND_NAME_PATTERNS
+])
+BOND_NAME_KEYWORDS = frozenset(BOND_NAME_PATTERNS)
+
 def get_non_company_ids():
     """Get all non-company IDs from the database"""
     db = Database()
@@ -25,35 +33,35 @@ def get_non_company_ids():
                 results = cur.fetchall()
                 
                 for id, ticker, name, sector in results:
-                    name_upper = name.upper()
+                    hits = set(NAME_MATCHER.find_all(name))
                     
                     # Warrants
-                    if 'WARRANT' in name_upper or ticker.endswith('W'):
+                    if 'WARRANT' in hits or ticker.endswith('W'):
                         categories['Warrants'].append((id, ticker, name))
                         all_ids.append(id)
                     
                     # Rights
-                    elif 'RIGHT' in name_upper or ticker.endswith('R'):
+                    elif 'RIGHT' in hits or ticker.endswith('R'):
                         categories['Rights'].append((id, ticker, name))
                         all_ids.append(id)
                     
                     # Units (often SPACs)
-                    elif 'UNIT' in name_upper or ticker.endswith('U'):
+                    elif 'UNIT' in hits or ticker.endswith('U'):
                         categories['Units'].append((id, ticker, name))
                         all_ids.append(id)
                     
                     # Acquisition Corps (SPACs)
-                    elif 'ACQUISITION CORP' in name_upper or 'SPAC' in name_upper:
+                    elif 'ACQUISITION CORP' in hits or 'SPAC' in hits:
                         categories['SPACs'].append((id, ticker, name))
                         all_ids.append(id)
                     
                     # Depositary Shares/Receipts
-                    elif 'DEPOSITARY' in name_upper or 'DEPOSITARY SHARE' in name_upper:
+                    elif 'DEPOSITARY' in hits:
                         categories['Depositary'].append((id, ticker, name))
                         all_ids.append(id)
                     
                     # Trusts (REITs are OK, but other trusts might not be)
-                    elif 'TRUST' in name_upper and 'REIT' not in name_upper and 'REAL ESTATE' not in name_upper:
+                    elif 'TRUST' in hits and 'REIT' not in hits and 'REAL ESTATE' not in hits:
                         categories['Trusts'].append((id, ticker, name))
                         all_ids.append(id)
                     
@@ -63,11 +71,7 @@ def get_non_company_ids():
                         all_ids.append(id)
                     
                     # Notes/Bonds (additional patterns)
-                    elif any(pattern in name_upper for pattern in [
-                        ' NT ', ' NTS ', ' NOTE', 'BOND', 'DEBENTURE',
-                        ' SR ', ' JR ', 'SENIOR', 'JUNIOR', 'SUBORDINATED',
-                        'DUE 20', 'FIXED RATE', 'FLOATING RATE'
-                    ]):
+                    elif hits & BOND_NAME_KEYWORDS:
                         categories['Bonds/Notes'].append((id, ticker, name))
                         all_ids.append(id)
                 